@@ -0,0 +1,285 @@
+import codecs
+import csv
+import io
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+import pandas as pd
+
+
+# Reading CSV files into product columns for the model. peek_csv() looks at the first
+# few KB only, enough to fill the column mapping, and the full parse waits until the
+# products are imported. Columns are converted as whole columns and handed to the model
+# as lists, instead of going through DataFrame.iterrows() which builds a Series for
+# every row. Big files are read and converted chunk by chunk. Only the mapped columns
+# are parsed, each straight to its type (see FIELD_DTYPES).
+
+# Enough for the header and a few sample rows of any realistic product file
+PEEK_BYTES = 64 * 1024
+# Files bigger than this are imported in chunks of CHUNK_ROWS rows, so memory stays at
+# one chunk's DataFrame instead of the whole file's
+CHUNKED_IMPORT_BYTES = 32 * 1024 * 1024
+CHUNK_ROWS = 50_000
+
+# How each mapped column is parsed. UPCs are read as text so leading zeros survive
+# instead of going through a float; expiration dates are text too and are tidied by
+# date_column().
+FIELD_DTYPES = {
+    "name": str,
+    "upc": str,
+    "expiration_date": str,
+    "price": "float64",
+}
+DELIMITERS = ",;\t|"
+# Dates date_column() writes out in full, with an optional time after them
+ISO_DATE = r"\d{4}-\d{1,2}-\d{1,2}([ T].*)?"
+
+
+@dataclass
+class CsvPeek:
+    columns: List[str]
+    delimiter: str = ","
+    encoding: str = "utf-8"
+    sample_rows: List[List[str]] = field(default_factory=list)
+
+
+def detect_encoding(head: bytes) -> str:
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A character cut in half at the end of the peeked bytes is still utf-8
+        if e.reason != "unexpected end of data":
+            return "cp1252"
+    return "utf-8"
+
+
+def peek_csv(path: str, sample_size: int = 3) -> CsvPeek:
+    """
+    Header, delimiter, encoding and the first sample_size rows, read from the start of
+    the file without parsing the rest of it
+    """
+    with open(path, "rb") as f:
+        head = f.read(PEEK_BYTES)
+    encoding = detect_encoding(head)
+
+    text = head.decode(encoding, errors="replace")
+    try:
+        sample = "\n".join(text.splitlines()[:sample_size + 1])
+        delimiter = csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ","
+
+    # The last peeked row may be cut off, so only rows before it are used
+    rows = list(islice(csv.reader(io.StringIO(text), delimiter=delimiter), sample_size + 2))
+    if len(head) == PEEK_BYTES:
+        rows = rows[:-1]
+    rows = rows[:sample_size + 1]
+    if not rows:
+        raise ValueError(f"{path} is empty")
+    return CsvPeek(columns=rows[0], delimiter=delimiter, encoding=encoding, sample_rows=rows[1:])
+
+
+class DataFrameCache:
+    """
+    LRU cache of parsed CSV columns. A column is keyed by the file's path, size and
+    modification time (so an edited file is parsed again), its delimiter and encoding,
+    and the column name and dtype it was parsed with. Importing the same file again,
+    also with a different column mapping, only parses the columns it has not parsed
+    before. Holds at most max_bytes of columns as measured by memory_usage(deep=True);
+    a column bigger than that is never cached.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (Series, bytes)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def file_key(path: str, peek: CsvPeek) -> tuple:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns, peek.delimiter, peek.encoding
+
+    @staticmethod
+    def column_key(file_key: tuple, column: str, dtype) -> tuple:
+        return file_key + (column, str(dtype))
+
+    def get(self, key: tuple) -> Optional[pd.Series]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: tuple, column: pd.Series):
+        size = int(column.memory_usage(deep=True))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (column, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> str:
+        return (f"csv cache: {self.hits} hits, {self.misses} misses, {len(self.entries)} columns, "
+                f"{self.total_bytes / (1024 * 1024):.1f} MB")
+
+
+def read_csv(path: str, peek: Optional[CsvPeek] = None, **kwargs) -> pd.DataFrame:
+    """
+    pd.read_csv with the delimiter and encoding found by peek_csv
+    """
+    if peek is None:
+        peek = peek_csv(path)
+    return pd.read_csv(path, sep=peek.delimiter, encoding=peek.encoding, **kwargs)
+
+
+def read_columns(path: str, dtypes: Dict[str, object], peek: Optional[CsvPeek] = None,
+                 cache: Optional[DataFrameCache] = None) -> pd.DataFrame:
+    """
+    The given columns of a CSV file parsed with the given dtypes, reading only the ones
+    the cache does not already hold. Cached columns are shared, so callers must not
+    modify them.
+    """
+    if peek is None:
+        peek = peek_csv(path)
+    if cache is None:
+        return read_csv(path, peek, usecols=list(dtypes), dtype=dtypes)
+
+    file_key = cache.file_key(path, peek)
+    columns = {}
+    missing = {}
+    for column, dtype in dtypes.items():
+        columns[column] = cache.get(cache.column_key(file_key, column, dtype))
+        if columns[column] is None:
+            missing[column] = dtype
+    if missing:
+        df = read_csv(path, peek, usecols=list(missing), dtype=missing)
+        for column, dtype in missing.items():
+            columns[column] = df[column]
+            cache.put(cache.column_key(file_key, column, dtype), df[column])
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_options(mappings: Dict[str, str]) -> dict:
+    """
+    read_csv arguments that parse only the mapped columns, with their FIELD_DTYPES
+    """
+    dtypes = {mappings[field]: dtype for field, dtype in FIELD_DTYPES.items() if mappings.get(field)}
+    return {"usecols": list(dtypes), "dtype": dtypes}
+
+
+def schema_error(error: ValueError, mappings: Dict[str, str]) -> ValueError:
+    # The price column is the only one parsed as a number, so a failed conversion is in it
+    if "could not convert" in str(error):
+        return ValueError(f"column '{mappings['price']}': {error}")
+    return error
+
+
+def read_products_frame(path: str, mappings: Dict[str, str], peek: Optional[CsvPeek] = None,
+                        cache: Optional[DataFrameCache] = None) -> pd.DataFrame:
+    """
+    The mapped columns of a CSV file, ready for columns_from_dataframe
+    """
+    try:
+        return read_columns(path, read_options(mappings)["dtype"], peek, cache)
+    except ValueError as e:
+        raise schema_error(e, mappings) from None
+
+
+def text_column(column: pd.Series) -> List[str]:
+    # Same strings the row by row import got from str(value), missing values included
+    return column.astype(str).fillna("nan").tolist()
+
+
+def date_column(column: pd.Series) -> List[str]:
+    """
+    ISO dates written out in full as YYYY-MM-DD (so 2025-6-5 and 2025-06-05 00:00:00
+    print alike). Anything else is kept as written: 06/15/2025 since the day and month
+    order can not be told apart, and partial dates like 2025-06 since they have no day.
+    """
+    # A file only has a few hundred distinct dates, so each is parsed once
+    codes, values = pd.factorize(column)
+    values = pd.Series(values, dtype=object)
+    # Only full dates, to_datetime would make up the missing day of 2025-06 or read
+    # 20250615 and 1000 as dates
+    iso = values.astype(str).str.fullmatch(ISO_DATE)
+    dates = values.copy()
+    dates[iso] = pd.to_datetime(values[iso], errors="coerce", format="ISO8601").dt.strftime("%Y-%m-%d")
+    dates = dates.fillna(values)
+    # Missing values get code -1, which picks the "nan" added at the end
+    strings = text_column(dates) + ["nan"]
+    return [strings[code] for code in codes]
+
+
+def columns_from_dataframe(df: pd.DataFrame, mappings: Dict[str, str]) -> Dict[str, list]:
+    """
+    mappings is field -> column name for name, price, upc and optionally
+    expiration_date. Returns field -> list of values, the form
+    ColumnarProductModel.add_columns takes. Raises ValueError naming the column if a
+    price is not a number, and the lines if a price is missing.
+    """
+    try:
+        prices = pd.to_numeric(df[mappings['price']]).astype(float)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"column '{mappings['price']}': {e}") from None
+    # Empty cells come through as NaN (and "inf" parses), neither makes a price
+    bad = prices.index[prices.isna() | prices.abs().eq(float('inf'))]
+    if len(bad):
+        # Line 1 is the header
+        lines = ", ".join(str(index + 2) for index in bad[:5]) + (", ..." if len(bad) > 5 else "")
+        raise ValueError(f"column '{mappings['price']}': missing or invalid price on line {lines}")
+    prices = prices.tolist()
+
+    if mappings.get('expiration_date'):
+        expiration_dates = date_column(df[mappings['expiration_date']])
+    else:
+        expiration_dates = [''] * len(df)
+
+    return {
+        'name': text_column(df[mappings['name']]),
+        'price': prices,
+        'upc': text_column(df[mappings['upc']]),
+        'expiration_date': expiration_dates,
+    }
+
+
+def iter_column_chunks(path: str, mappings: Dict[str, str], peek: Optional[CsvPeek] = None,
+                       chunksize: int = CHUNK_ROWS) -> Iterator[Dict[str, list]]:
+    """
+    columns_from_dataframe for a CSV file, chunksize rows at a time. A bad price raises
+    ValueError naming the chunk it is in; the chunks before it have already been yielded.
+    """
+    if peek is None:
+        peek = peek_csv(path)
+    first_line = 2  # line 1 is the header
+    with pd.read_csv(path, sep=peek.delimiter, encoding=peek.encoding, chunksize=chunksize,
+                     **read_options(mappings)) as reader:
+        while True:
+            try:
+                chunk = next(reader, None)
+                if chunk is None:
+                    return
+                columns = columns_from_dataframe(chunk, mappings)
+            except ValueError as e:
+                raise ValueError(f"{schema_error(e, mappings)} (in the {chunksize} rows from line {first_line})") from None
+            yield columns
+            first_line += len(chunk)
@@ -0,0 +1,378 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from array import array
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from LabelModel import ColumnarProductModel, Product
+
+
+# Reproducible end-to-end benchmark of the label rendering path, e.g.
+#   python LabelBenchmark.py --sizes 1000,10000 --out bench.json
+#   python LabelBenchmark.py --sizes 1000,10000 --baseline bench.json
+# Every case runs in a fresh process so peak memory is measured per case.
+#   python LabelBenchmark.py --barcodes 5000
+# compares encode and draw cost per barcode symbology instead, and
+#   python LabelBenchmark.py --memory 100000
+# reports how many bytes each way of holding products costs per product.
+
+try:
+    import resource
+except ImportError:  # Windows, peak memory is not reported there
+    resource = None
+
+# Variant -> (style, color_enabled, exp_enable) as called by LabelMaker.py / LabelMaker2.py
+VARIANTS = {
+    "sale": ("SALE_STYLE", False, True),
+    "plain": ("PLAIN_STYLE", True, False),
+}
+
+WORDS = [
+    "Organic", "Fresh", "Whole", "Milk", "Bread", "Cheddar", "Cheese", "Apple", "Juice", "Greek",
+    "Yogurt", "Vanilla", "Chocolate", "Chip", "Cookies", "Sparkling", "Water", "Lemon", "Lime", "Frozen",
+    "Pizza", "Pepperoni", "Chicken", "Breast", "Boneless", "Skinless", "Ground", "Beef", "Extra", "Lean",
+    "Basmati", "Rice", "Olive", "Oil", "Virgin", "Pasta", "Spaghetti", "Tomato", "Sauce", "Garlic",
+    "Family", "Size", "Value", "Pack", "Low", "Fat", "Unsweetened", "Almond", "Peanut", "Butter",
+]
+SIZES = ["250g", "500g", "1kg", "355ml", "1L", "2L", "12pk", "6ct", "400g", "750ml"]
+
+
+def upc_a(rng: random.Random) -> str:
+    digits = [rng.randrange(10) for _ in range(11)]
+    check = (10 - (sum(digits[0::2]) * 3 + sum(digits[1::2])) % 10) % 10
+    return "".join(map(str, digits)) + str(check)
+
+
+def synthetic_products(count: int, seed: int = 1234) -> List[Product]:
+    """
+    Products with realistic name lengths (2-6 words plus a pack size), prices and valid
+    UPC-A codes. The same seed always gives the same products.
+    """
+    rng = random.Random(seed)
+    products = []
+    for _ in range(count):
+        name = " ".join(rng.sample(WORDS, rng.randint(2, 6)) + [rng.choice(SIZES)])
+        products.append(Product(
+            name=name,
+            price=round(rng.uniform(0.49, 99.99), 2),
+            upc=upc_a(rng),
+            expiration_date=f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            source="csv",
+        ))
+    return products
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(case: dict, results) -> None:
+    import LabelRenderer
+
+    style_name, color_enabled, exp_enable = VARIANTS[case["variant"]]
+    style = getattr(LabelRenderer, style_name)
+    products = synthetic_products(case["labels"], case["seed"])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = os.path.join(tmp, "labels.pdf")
+        start = time.perf_counter()
+        if case["mode"] == "stream":
+            LabelRenderer.stream_labels_pdf(iter(products), output_file, style, color_enabled, exp_enable,
+                                            case["template"], case["diff_state"])
+        else:
+            LabelRenderer.create_labels_pdf(products, output_file, style, color_enabled, exp_enable,
+                                            case["workers"], case["template"], case["diff_state"])
+        seconds = time.perf_counter() - start
+        output_bytes = os.path.getsize(output_file)
+
+    results.put(dict(case,
+                     seconds=round(seconds, 3),
+                     labels_per_sec=round(case["labels"] / seconds, 1),
+                     peak_rss_mb=peak_rss_mb(),
+                     output_bytes=output_bytes))
+
+
+def run_case_safely(case: dict, results) -> None:
+    # The parent process waits on results, so a case that fails still has to report back
+    try:
+        run_case(case, results)
+    except BaseException as e:
+        results.put(dict(case, error=f"{type(e).__name__}: {e}"))
+        raise
+
+
+def barcode_values(symbology: str, count: int, seed: int) -> List[str]:
+    """
+    Values each symbology can encode, derived from the same synthetic UPC-A codes
+    """
+    rng = random.Random(seed)
+    upcs = [upc_a(rng) for _ in range(count)]
+    if symbology == "ean13":
+        return ["0" + upc for upc in upcs]
+    if symbology == "usps":
+        return [upc[:11] for upc in upcs]
+    if symbology == "usps4s":
+        # 20 digit tracking code (second digit 0-4) plus an 11 digit routing code
+        return ["00" + upc + upc[:6] + upc[:11] for upc in upcs]
+    return upcs
+
+
+def run_barcode_benchmarks(count: int, seed: int) -> List[dict]:
+    """
+    Time to build (encode) and to draw one barcode per symbology, at the label's bar size
+    """
+    from BarcodeSymbologies import SYMBOLOGIES, get_encoder, resolve_symbology
+    from LabelRenderer import encode_once
+    from SheetTemplates import DEFAULT_SHEET
+    from StreamingPdf import StreamingCanvas
+
+    bar_height, bar_width = DEFAULT_SHEET.label_height / 3, .75
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in SYMBOLOGIES:
+            values = barcode_values(name, count, seed)
+            assert all(resolve_symbology(name, value) == name for value in values), name
+            encode = get_encoder(name, bar_height, bar_width)
+
+            start = time.perf_counter()
+            barcodes = [encode_once(encode(value)) for value in values]
+            encode_seconds = time.perf_counter() - start
+
+            output_file = os.path.join(tmp, f"{name}.pdf")
+            c = StreamingCanvas(output_file)
+            start = time.perf_counter()
+            for index, barcode in enumerate(barcodes, start=1):
+                barcode.drawOn(c, 0, 0)
+                if index % DEFAULT_SHEET.labels_per_page == 0:
+                    c.showPage()
+            c.save()
+            draw_seconds = time.perf_counter() - start
+
+            result = dict(symbology=name, barcodes=count, seed=seed,
+                          encode_us=round(encode_seconds / count * 1e6, 1),
+                          draw_us=round(draw_seconds / count * 1e6, 1),
+                          width_pt=round(barcodes[0].width, 1),
+                          output_bytes=os.path.getsize(output_file))
+            results.append(result)
+            print(f"{name:<18} {result['encode_us']:>9.1f} us encode {result['draw_us']:>9.1f} us draw "
+                  f"{result['width_pt']:>7.1f} pt wide {result['output_bytes']:>12,d} bytes")
+    return results
+
+
+@dataclass
+class DictProduct:
+    """
+    Product as it was before it had slots and integer cents, the baseline for --memory
+    """
+    name: str
+    price: float
+    upc: str
+    expiration_date: Optional[str] = None
+    source: str = "manual"
+
+
+def run_memory_benchmarks(count: int, seed: int = 1234) -> List[dict]:
+    """
+    Bytes per product held by a list of DictProduct, a list of Product and a
+    ColumnarProductModel, built from the same values. Names, UPCs and dates are shared
+    by all three and left out; prices come from an array so each layout pays for its
+    own price objects, as it does when reading a CSV file.
+    """
+    products = synthetic_products(count, seed)
+    names = [product.name for product in products]
+    prices = array('d', (product.price for product in products))
+    upcs = [product.upc for product in products]
+    dates = [product.expiration_date for product in products]
+    del products
+
+    def columnar():
+        model = ColumnarProductModel()
+        model.add_columns({'name': names, 'price': prices, 'upc': upcs, 'expiration_date': dates})
+        return model
+
+    layouts = {
+        "dataclass": lambda: [DictProduct(*row, source="csv") for row in zip(names, prices, upcs, dates)],
+        "slotted": lambda: [Product(*row, source="csv") for row in zip(names, prices, upcs, dates)],
+        "columnar": columnar,
+    }
+    results = []
+    for layout, build in layouts.items():
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        held = build()
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del held
+
+        result = dict(layout=layout, products=count, seed=seed, bytes_per_product=round(used / count, 1))
+        results.append(result)
+        print(f"{layout:<10} {result['bytes_per_product']:>8.1f} bytes/product")
+    return results
+
+
+def wait_for_result(case: dict, process, results) -> dict:
+    """
+    The case's result, or an error result if the process died without sending one
+    (e.g. killed for running out of memory)
+    """
+    while True:
+        try:
+            return results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                break
+    try:
+        # It may have sent its result just before exiting
+        return results.get(timeout=1)
+    except queue.Empty:
+        return dict(case, error=f"benchmark process exited with code {process.exitcode}")
+
+
+def run_benchmarks(cases: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """
+    Runs every case, returns (results, failed cases)
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    failed = []
+    for case in cases:
+        result_queue = ctx.Queue()
+        process = ctx.Process(target=run_case_safely, args=(case, result_queue))
+        process.start()
+        result = wait_for_result(case, process, result_queue)
+        process.join()
+        if "error" in result:
+            failed.append(result)
+            print(f"{case_key(result):<40} FAILED {result['error']}")
+            continue
+        results.append(result)
+        print(f"{case_key(result):<40} {result['labels_per_sec']:>10.1f} labels/s "
+              f"{result['peak_rss_mb'] or 0:>8.1f} MB {result['output_bytes']:>12,d} bytes")
+    return results, failed
+
+
+def case_key(result: dict) -> str:
+    key = f"{result['variant']}/{result['mode']}/{result['labels']}"
+    if result["workers"] > 1:
+        key += f"/w{result['workers']}"
+    if result["template"]:
+        key += "/template"
+    if result["diff_state"]:
+        key += "/diff"
+    return key
+
+
+def compare(results: List[dict], baseline: List[dict], threshold: float) -> List[str]:
+    """
+    Returns a line per metric that got worse than the baseline by more than threshold
+    (0.1 = 10%) for the same case
+    """
+    previous = {case_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(case_key(result))
+        if before is None:
+            continue
+
+        checks = [
+            ("labels/s", before["labels_per_sec"], result["labels_per_sec"], False),
+            ("peak MB", before["peak_rss_mb"], result["peak_rss_mb"], True),
+            ("bytes", before["output_bytes"], result["output_bytes"], True),
+        ]
+        for metric, old, new, higher_is_worse in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > threshold) if higher_is_worse else (change < -threshold):
+                regressions.append(f"{case_key(result)}: {metric} {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark label rendering")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated label counts")
+    parser.add_argument("--variants", default="plain,sale", help="comma separated: plain, sale")
+    parser.add_argument("--mode", choices=["canvas", "stream"], default="canvas")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--template", action="store_true")
+    parser.add_argument("--diff-state", action="store_true")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown/growth (default: 0.1)")
+    parser.add_argument("--barcodes", type=int, metavar="N",
+                        help="compare encode/draw cost of N barcodes per symbology instead")
+    parser.add_argument("--memory", type=int, metavar="N",
+                        help="report bytes per product for N products in each product layout instead")
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        results = run_memory_benchmarks(args.memory, args.seed)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "memory": results,
+                }, f, indent=2)
+        return 0
+
+    if args.barcodes:
+        results = run_barcode_benchmarks(args.barcodes, args.seed)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "barcodes": results,
+                }, f, indent=2)
+        return 0
+
+    cases = [
+        dict(variant=variant, labels=int(size), mode=args.mode, workers=args.workers,
+             template=args.template, diff_state=args.diff_state, seed=args.seed)
+        for variant in args.variants.split(",")
+        for size in args.sizes.split(",")
+    ]
+    results, failed = run_benchmarks(cases)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "results": results,
+                "failed": failed,
+            }, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        matched = {case_key(result) for result in baseline} & {case_key(result) for result in results}
+        if not matched:
+            print("Baseline has none of these cases, nothing to compare")
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions or failed:
+            return 1
+        if matched:
+            print(f"No regressions against baseline ({len(matched)} cases compared)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Sequence, Tuple
+from LabelRenderer import (CancelToken, LabelStyle, PageCache, ProgressCallback, RenderStats, TimingCanvas,
+                           define_label_form, page_count, render_page)
+from SheetTemplates import DEFAULT_SHEET, SheetTemplate
+from StreamingPdf import StreamingCanvas
+
+
+# Long label runs as jobs that can be cancelled and picked up again later. A job draws
+# its pages in shards of shard_pages pages. The compressed pages of every finished shard
+# are kept next to the output file and listed in a checkpoint, e.g.
+#   labels.pdf.job/checkpoint.json
+#   labels.pdf.job/shard-00003.bin
+# so running the same job again after a cancel or a crash only draws the shards that
+# were not finished. Both are removed once the PDF is complete.
+
+# Shard index -> [[content length, [font names]], ...] for every page in the shard
+ShardLayout = List[List]
+
+
+class LabelJob:
+    def __init__(self, products: Sequence, output_file: str, style: LabelStyle, color_enabled: bool,
+                 exp_enable: bool, use_template: bool = False, diff_state: bool = False,
+                 sheet: SheetTemplate = DEFAULT_SHEET, shard_pages: int = 10, job_dir: Optional[str] = None,
+                 cancel_token: Optional[CancelToken] = None):
+        self.products = products
+        self.output_file = output_file
+        self.style = style
+        self.color_enabled = color_enabled
+        self.exp_enable = exp_enable
+        self.use_template = use_template
+        self.diff_state = diff_state
+        self.sheet = sheet
+        self.shard_pages = max(1, shard_pages)
+        self.job_dir = job_dir or output_file + ".job"
+        self.checkpoint_file = os.path.join(self.job_dir, "checkpoint.json")
+        self.cancel_token = cancel_token or CancelToken()
+
+    def cancel(self):
+        """
+        Stops run() before the next label, from any thread. Finished shards are kept.
+        """
+        self.cancel_token.cancel()
+
+    def job_key(self) -> str:
+        settings = (self.style, self.color_enabled, self.exp_enable, self.use_template, self.diff_state,
+                    self.sheet, self.shard_pages)
+        return PageCache.page_key(self.products, settings)
+
+    def shard_file(self, index: int) -> str:
+        return os.path.join(self.job_dir, f"shard-{index:05d}.bin")
+
+    def load_checkpoint(self, job_key: str) -> Dict[int, ShardLayout]:
+        """
+        Finished shards left by an earlier run of this same job, empty if there are none
+        """
+        try:
+            with open(self.checkpoint_file, encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if checkpoint.get("job") != job_key:
+            return {}
+
+        finished = {}
+        for index, layout in checkpoint.get("shards", {}).items():
+            expected_size = sum(length for length, _ in layout)
+            try:
+                if os.path.getsize(self.shard_file(int(index))) == expected_size:
+                    finished[int(index)] = layout
+            except OSError:
+                pass
+        return finished
+
+    def save_checkpoint(self, job_key: str, finished: Dict[int, ShardLayout]):
+        # Write then rename, so a crash never leaves a half written checkpoint behind
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump({"job": job_key, "shards": {str(index): layout for index, layout in finished.items()}}, f)
+        os.replace(temp_file, self.checkpoint_file)
+
+    def read_shard(self, index: int, layout: ShardLayout) -> List[Tuple[bytes, frozenset]]:
+        with open(self.shard_file(index), "rb") as f:
+            return [(f.read(length), frozenset(fonts)) for length, fonts in layout]
+
+    def write_shard(self, index: int, pages: List[Tuple[bytes, frozenset]]) -> ShardLayout:
+        with open(self.shard_file(index), "wb") as f:
+            for content, _ in pages:
+                f.write(content)
+        return [[len(content), sorted(fonts)] for content, fonts in pages]
+
+    def run(self, stats: Optional[RenderStats] = None, progress: Optional[ProgressCallback] = None,
+            page_cache: Optional[PageCache] = None):
+        """
+        Renders the job to output_file, reusing shards finished by an earlier run. Raises
+        RenderCancelled when cancelled, leaving output_file untouched.
+        """
+        os.makedirs(self.job_dir, exist_ok=True)
+        job_key = self.job_key()
+        finished = self.load_checkpoint(job_key)
+
+        labels_per_page = self.sheet.labels_per_page
+        shard_size = self.shard_pages * labels_per_page
+        total_pages = page_count(self.products, self.sheet)
+        pages_done = 0
+
+        # Pages go to a temporary file so an unfinished run never replaces a good PDF
+        temp_file = self.output_file + ".part"
+        c = StreamingCanvas(temp_file, pagesize=self.sheet.pagesize, pageCompression=1)
+        if stats is not None and stats.timings is not None:
+            c = TimingCanvas(c, stats.timings)
+
+        try:
+            form_name = define_label_form(c, self.style, self.color_enabled, self.sheet) if self.use_template else None
+
+            for index, shard_start in enumerate(range(0, len(self.products), shard_size)):
+                # Also checked here, shards that come from disk or page_cache draw no labels
+                self.cancel_token.raise_if_cancelled()
+                if index in finished:
+                    pages = self.read_shard(index, finished[index])
+                    if stats is not None:
+                        stats.pages_reused += len(pages)
+                    if progress is not None:
+                        progress(pages_done + len(pages), total_pages)
+                else:
+                    shard = self.products[shard_start:shard_start + shard_size]
+                    pages = []
+                    for start in range(0, len(shard), labels_per_page):
+                        pages.append(render_page(c, shard[start:start + labels_per_page], self.style,
+                                                 self.color_enabled, self.exp_enable, form_name, self.sheet,
+                                                 page_cache, self.diff_state, stats, self.cancel_token))
+                        if progress is not None:
+                            progress(pages_done + len(pages), total_pages)
+                    finished[index] = self.write_shard(index, pages)
+                    self.save_checkpoint(job_key, finished)
+
+                for page in pages:
+                    c.add_page(*page)
+                pages_done += len(pages)
+
+            c.save()
+        except BaseException:
+            c.close()
+            os.remove(temp_file)
+            raise
+
+        os.replace(temp_file, self.output_file)
+        shutil.rmtree(self.job_dir, ignore_errors=True)
@@ -1,19 +1,17 @@
 import os
 import dearpygui.dearpygui as dpg
-import pandas as pd
-from dataclasses import dataclass
-from typing import List, Optional
-from reportlab.graphics.barcode import code128
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.graphics.barcode import code93
-from reportlab.graphics.barcode import code39
-from reportlab.graphics.barcode import usps
-from reportlab.graphics.barcode import usps4s
-from reportlab.graphics.barcode import ecc200datamatrix
+from typing import List, Optional, Tuple
 import subprocess
+import multiprocessing
+import queue
+import threading
+import time
+import CsvImport
+import LabelJobs
+import LabelPreview
+import LabelRenderer
+from LabelModel import ColumnarProductModel, Product
+from SheetTemplates import DEFAULT_SHEET, SHEET_TEMPLATES, SheetTemplate
 
 
 # python>=3.11
@@ -21,54 +19,27 @@ import subprocess
 # reportlab
 # typing
 # dearpygui
+# pypdf (optional, parallel label rendering)
 
 
 
-# Model code remains the same as before
-@dataclass
-class Product:
-    name: str
-    price: float
-    upc: str
-    expiration_date: Optional[str] = None
-    source: str = "manual"
-
-    @classmethod
-    def from_dict(cls, data: dict, source: str = "manual") -> 'Product':
-        return cls(
-            name=str(data['name']),
-            price=float(data['price']),
-            upc=str(data['upc']),
-            expiration_date=str(data.get('expiration_date', '')),
-            source=source
-        )
-
-class ProductModel:
-    def __init__(self):
-        self.products: List[Product] = []
-
-    def add_product(self, product: Product) -> None:
-        if product != "":
-            self.products.append(product)
-
-
-    def get_all_products(self) -> List[Product]:
-        return self.products
-
-    def remove_all_products(self) -> None:
-        self.products.clear()
-
-    def get_one_product(self)->None:
-        pass
-
-
 class LabelMakerApp:
     def __init__(self):
-        self.model = ProductModel()
+        self.model = ColumnarProductModel()
+        self.page_cache = LabelRenderer.PageCache()
+        self.preview_cache = LabelPreview.PreviewCache()
+        # Label generation runs on render_thread and reports back through render_queue
+        self.render_queue = queue.Queue()
+        self.render_thread = None
+        self.render_cancel = None
         self.setup_dpg()
         self.create_windows()
         self.csv_mappings = {}
         self.csv_file_path = None
+        self.csv_peek = None
+        # Parsed CSV columns, so importing the same file again, also with a changed
+        # mapping, only parses the columns that were not read before
+        self.csv_cache = CsvImport.DataFrameCache()
         self.selected_row = None
         self.selected_product = None
         self.selected_index = None
@@ -79,6 +50,15 @@ class LabelMakerApp:
         dpg.create_viewport(title="Label Maker v1.2.6", width=1130, height=627)
         dpg.setup_dearpygui()
 
+        # Label preview, redrawn in place whenever another product is selected
+        with dpg.texture_registry():
+            dpg.add_dynamic_texture(
+                LabelPreview.preview_width,
+                LabelPreview.preview_height,
+                [1.0] * (LabelPreview.preview_width * LabelPreview.preview_height * 4),
+                tag="preview_texture"
+            )
+
         # Create theme for disabled items
         with dpg.theme() as self.disabled_theme:
             with dpg.theme_component(dpg.mvAll):
@@ -91,6 +71,7 @@ class LabelMakerApp:
                 dpg.add_menu_item(label="Show Manual Entry", callback=lambda: dpg.show_item("manual_window"))
                 dpg.add_menu_item(label="Show CSV Import", callback=lambda: dpg.show_item("csv_window"))
                 dpg.add_menu_item(label="Show Product List", callback=lambda: dpg.show_item("list_window"))
+                dpg.add_menu_item(label="Show Label Preview", callback=lambda: dpg.show_item("preview_window"))
 
             with dpg.menu(label="Actions"):
                 dpg.add_menu_item(label="Create Labels", callback=self.create_labels)
@@ -128,6 +109,7 @@ class LabelMakerApp:
         self.create_manual_entry_window()
         self.create_csv_import_window()
         self.create_product_list_window()
+        self.create_preview_window()
 
     def create_manual_entry_window(self):
         # Manual Entry Window
@@ -181,6 +163,7 @@ class LabelMakerApp:
             with dpg.group(horizontal=True):
                 dpg.add_text("CSV File:")
                 dpg.add_text("No file selected", tag="csv_file_label")
+            dpg.add_text("", tag="csv_preview", wrap=380)
             dpg.add_button(label="Select File", callback=lambda: dpg.show_item("file_dialog_tag"))
 
             dpg.add_separator()
@@ -232,7 +215,7 @@ class LabelMakerApp:
             )
 
             # Update the product in the appropriate list
-            self.model.products[self.selected_index] = updated_product
+            self.model.replace_product(self.selected_index, updated_product)
 
             # Update display
             self.update_product_list()
@@ -255,8 +238,7 @@ class LabelMakerApp:
 
         try:
             # Remove from appropriate list
-            self.model.products.pop(self.selected_index)
-            print(self.model.products)
+            self.model.remove_product(self.selected_index)
 
             self.update_product_list()
             dpg.set_value("list_status", f"Deleted product: {self.selected_product.name}")
@@ -275,6 +257,17 @@ class LabelMakerApp:
         if 0 <= self.selected_index < len(all_products):
             self.selected_product = all_products[self.selected_index]
             dpg.set_value("list_status", f"Selected product: {self.selected_product.name}")
+            self.update_preview()
+
+    def update_preview(self):
+        if self.selected_product is None:
+            return
+        # Cached per product and settings, so clicking back and forth through the table is instant
+        data = self.preview_cache.preview(self.selected_product, LabelRenderer.SALE_STYLE, False, True,
+                                          SHEET_TEMPLATES[dpg.get_value("sheet_combo")])
+        dpg.set_value("preview_texture", data)
+        dpg.set_value("preview_status", str(self.selected_product.name))
+        dpg.show_item("preview_window")
 
     def create_product_list_window(self):
         with dpg.window(label="Product List", tag="list_window", no_close=True, no_collapse=True,
@@ -295,6 +288,38 @@ class LabelMakerApp:
                                 callback=self.clear_table_fields,
                                 width=120
                             )
+                            dpg.add_input_int(
+                                label="Workers",
+                                tag="workers_input",
+                                default_value=1,
+                                min_value=1,
+                                min_clamped=True,
+                                width=80
+                            )
+                            dpg.add_checkbox(
+                                label="Template",
+                                tag="template_checkbox",
+                                default_value=True
+                            )
+            with dpg.group(horizontal=True):
+                            dpg.add_text("Label Sheet:")
+                            dpg.add_combo(
+                                list(SHEET_TEMPLATES),
+                                tag="sheet_combo",
+                                default_value=DEFAULT_SHEET.name,
+                                callback=lambda: self.update_preview(),
+                                width=200
+                            )
+                            dpg.add_checkbox(
+                                label="Show Timings",
+                                tag="timings_checkbox",
+                                default_value=False
+                            )
+                            dpg.add_checkbox(
+                                label="Compact PDF",
+                                tag="compact_checkbox",
+                                default_value=False
+                            )
 
             dpg.add_separator()
             with dpg.table(tag="product_table", header_row=True,
@@ -309,7 +334,16 @@ class LabelMakerApp:
                 dpg.add_table_column(label="Exp Date", width=150)
 
             dpg.add_text("", tag="list_status")
+            with dpg.group(horizontal=True, tag="render_progress_group", show=False):
+                dpg.add_progress_bar(tag="render_progress", default_value=0.0, width=-90)
+                dpg.add_button(label="Cancel", callback=self.cancel_labels, width=80)
+
 
+    def create_preview_window(self):
+        with dpg.window(label="Label Preview", tag="preview_window", show=False, no_collapse=True,
+                        pos=[730, 360], autosize=True):
+            dpg.add_image("preview_texture")
+            dpg.add_text("", tag="preview_status")
 
     def set_mapping_enabled(self, enabled: bool):
         """Enable or disable mapping controls"""
@@ -339,14 +373,16 @@ class LabelMakerApp:
     def select_csv_file(self, csv_file_path):
         self.csv_file_path = csv_file_path
         try:
-            df = pd.read_csv(csv_file_path)
-            columns = df.columns.tolist()
+            # Only the start of the file is read here, the full parse waits for Import Products
+            self.csv_peek = CsvImport.peek_csv(csv_file_path)
+            columns = self.csv_peek.columns
 
             # Update mapping combos
             for field in ['name', 'price', 'upc', 'expiration_date']:
                 dpg.configure_item(f"{field}_map", items=columns)
 
             dpg.set_value("csv_file_label", f"Selected: {csv_file_path}")
+            dpg.set_value("csv_preview", self.csv_preview_text(self.csv_peek))
             self.set_mapping_enabled(True)
             dpg.set_value("csv_status", "Ready to map columns")
 
@@ -354,6 +390,13 @@ class LabelMakerApp:
             dpg.set_value("csv_status", f"Error loading file: {str(e)}")
             self.set_mapping_enabled(False)
 
+    def csv_preview_text(self, peek: CsvImport.CsvPeek) -> str:
+        delimiter = {"\t": "tab", " ": "space"}.get(peek.delimiter, peek.delimiter)
+        lines = [f"Delimiter: {delimiter}   Encoding: {peek.encoding}"]
+        for row in peek.sample_rows:
+            lines.append(" | ".join(value if len(value) <= 14 else value[:13] + "~" for value in row))
+        return "\n".join(lines)
+
     def import_csv_products(self):
         if not self.csv_file_path:
             dpg.set_value("csv_status", "Please select a CSV file first")
@@ -367,26 +410,51 @@ class LabelMakerApp:
             }
 
             # Import products
-            df = pd.read_csv(self.csv_file_path)
-            for _, row in df.iterrows():
-                product_data = {
-                    'name': str(row[mappings['name']]),
-                    'price': float(row[mappings['price']]),
-                    'upc': str(row[mappings['upc']]),
-                    'expiration_date': str(row[mappings['expiration_date']]) if mappings.get('expiration_date') else ''
-                }
-                self.model.add_product(Product.from_dict(product_data, source="csv"))
+            start = time.perf_counter()
+            # Products whose UPC is already in the list are updated instead of added again
+            if os.path.getsize(self.csv_file_path) > CsvImport.CHUNKED_IMPORT_BYTES:
+                imported, updated = self.import_csv_chunks(mappings)
+                cached = ""
+            else:
+                hits = self.csv_cache.hits
+                df = CsvImport.read_products_frame(self.csv_file_path, mappings, self.csv_peek, self.csv_cache)
+                cached_columns = self.csv_cache.hits - hits
+                cached = f" ({cached_columns} cached columns)" if cached_columns else ""
+                updated = self.model.upsert_columns(CsvImport.columns_from_dataframe(df, mappings), source="csv")
+                imported = len(df)
+            seconds = time.perf_counter() - start
 
             self.update_product_list()
-            dpg.set_value("csv_status", "Products imported successfully")
+            dpg.set_value("csv_status", f"Imported {imported} products ({updated} updated) in {seconds:.2f}s "
+                                        f"({imported / max(seconds, 1e-6):,.0f} rows/s){cached}")
 
         except Exception as e:
             dpg.set_value("csv_status", f"Import error: {str(e)}")
 
+    def import_csv_chunks(self, mappings) -> Tuple[int, int]:
+        """
+        Adds a big CSV file to the model one chunk at a time, showing the running count.
+        Products from chunks before an error stay imported. Returns (imported, updated).
+        """
+        imported = updated = 0
+        try:
+            for columns in CsvImport.iter_column_chunks(self.csv_file_path, mappings, self.csv_peek):
+                updated += self.model.upsert_columns(columns, source="csv")
+                imported += len(columns['name'])
+                dpg.set_value("csv_status", f"Importing... {imported:,} rows")
+        except Exception as e:
+            if not imported:
+                raise
+            self.update_product_list()
+            raise ValueError(f"{e}, {imported} products were imported before it") from None
+        return imported, updated
+
 
     def clear_csv_import(self):
         self.csv_file_path = None
         dpg.set_value("csv_file_label", "No file selected")
+        dpg.set_value("csv_preview", "")
+        self.csv_peek = None
         for field in ['name', 'price', 'upc', 'expiration_date']:
             dpg.set_value(f"{field}_map", "")
         self.set_mapping_enabled(False)
@@ -621,7 +689,12 @@ class LabelMakerApp:
         dpg.delete_item(user_data[0])
 
     def create_labels(self):
-        products = self.model.get_all_products()
+        if self.render_thread is not None and self.render_thread.is_alive():
+            dpg.set_value("list_status", "Labels are still being generated")
+            return
+
+        # Copy the columns so products edited while the labels render do not change this run
+        products = self.model.snapshot()
         if not products:
             dpg.set_value("list_status", "No products to create labels for")
             return
@@ -632,128 +705,93 @@ class LabelMakerApp:
 
         # Define the output file path
         output_file = os.path.join(desktop, "labels.pdf")
-        self.show_info("Message Box", "Do you wish to open the generated file?", self.on_selection)
-
-        self.create_labels_pdf(products, output_file, False, True)
-        dpg.set_value("list_status", f"Labels created: {os.path.basename(output_file)}")
-
-    def create_labels_pdf(self, products: List[Product], output_file: str, color_enabled: bool, exp_enable: bool):
 
-        c = canvas.Canvas(output_file, pagesize=letter)
-        width, height = letter
+        timings = LabelRenderer.PhaseTimer() if dpg.get_value("timings_checkbox") else None
+        stats = LabelRenderer.RenderStats(timings=timings)
+        render_args = (products, output_file, False, True, dpg.get_value("workers_input"),
+                       dpg.get_value("template_checkbox"), True, stats,
+                       SHEET_TEMPLATES[dpg.get_value("sheet_combo")], dpg.get_value("compact_checkbox"))
+
+        dpg.set_value("list_status", "Generating labels...")
+        dpg.set_value("render_progress", 0.0)
+        dpg.configure_item("render_progress", overlay="")
+        dpg.configure_item("render_progress_group", show=True)
+        self.render_cancel = LabelRenderer.CancelToken()
+        self.render_thread = threading.Thread(target=self.render_labels_worker, args=(output_file, stats, render_args),
+                                              daemon=True)
+        self.render_thread.start()
+
+    def render_labels_worker(self, output_file: str, stats: LabelRenderer.RenderStats, render_args: tuple):
+        """Runs on render_thread. Never touches dpg, everything goes through render_queue."""
+        def report_progress(pages_done: int, total_pages: int):
+            self.render_queue.put(("progress", pages_done, total_pages))
 
-        # Label dimensions
-        label_width = 2.5 * inch
-        label_height = 1 * inch
-
-
-        text_area_width = 1.75 * inch
-        price_area_width = 0.75 * inch
-
-        margin_x = 0.1875 * inch
-        margin_y = -1 * inch
-
-        labels_per_row = 3
-        labels_per_col = 9
-
-        label_spacing_x = 0.2 * inch
-        label_spacing_y = 0.2 * inch
-
-        total_products = len(products)
-        product_index = 0
-
-        while product_index < total_products:
-            for i in range(labels_per_col):
-                for j in range(labels_per_row):
-                    if product_index >= total_products:
-                        break
-
-                    product = products[product_index]
-                    product_name = str(product.name)
-
-                    x = margin_x + j * (label_width + label_spacing_x)
-                    y = height - margin_y - (i + 1) * (label_height + label_spacing_y)
-
-                    # Draw label border
-                    c.setLineWidth(0.5)
-                    c.setFillColor(colors.yellow)
-                    c.setStrokeColor(colors.red)
-                    c.rect(x, y - label_height, label_width, label_height,fill=True)
-
-                    # Draw product name
-                    c.setFillColor(colors.black)
-                    c.setFont("Helvetica-Bold", 12)
-
-                    first_line_limit = 25
-                    product_name_lines = self.split_text(product_name, first_line_limit)
-
-                    for line_index, line in enumerate(product_name_lines):
-                        c.drawString(x + 5, y - 15 - (line_index * 10), line)
-
-                    # Draw expiration date if enabled
-                    if exp_enable:
-                        c.setFont("Helvetica", 10)
-                        expiration_date = str(product.expiration_date if product.expiration_date else 'N/A')
-                        c.drawString(x + 5, y - 35, f"Weight: {expiration_date}")
-
-                    # Draw barcode
-                    barcode_x_position = x - margin_x
-                    barcode_y_position = y - label_height + 5
-                    c.setFillColor(colors.red)
-                    c.setFont("Helvetica-Bold", 28)  #let users decide with a settigns pannel
-                    c.drawString(barcode_x_position+14, barcode_y_position, "SALE!")
-
-
-                    # barcode = code128.Code128(barcode_value, barHeight=label_height / 3, barWidth=.75)
-                    # barcode.drawOn(c, barcode_x_position, barcode_y_position)
-
-                    # Draw price
-                    price_x_position = x + text_area_width-15
-                    price_y_position = y - 65
-
-                    if color_enabled:
-                        c.setFillColor(colors.red)
-                        c.rect(price_x_position-10, price_y_position-7, price_area_width+25, 30, fill=True)
-
-                    c.setFillColor(colors.black)
-                    c.setFont("Helvetica-Bold", 24)  #let users decide with a settigns pannel
-                    price_value = f"{str(product.price)}"
-                    c.drawString(price_x_position+1, price_y_position-2, price_value)
-
-                    c.setFillColor(colors.black)
-                    c.setFont("Helvetica-Bold", 14)
-                    dollarsign = f"$"
-                    c.drawString(price_x_position-8, price_y_position-2, dollarsign)
-
-                    product_index += 1
-
-                if product_index >= total_products:
-                    break
+        try:
+            self.create_labels_pdf(*render_args, progress=report_progress, cancel=self.render_cancel)
+        except LabelRenderer.RenderCancelled:
+            # Only the single process path (LabelJob) keeps its finished shards
+            workers = render_args[4]
+            self.render_queue.put(("cancelled", workers <= 1))
+        except Exception as e:
+            self.render_queue.put(("error", str(e)))
+        else:
+            self.render_queue.put(("done", output_file, stats))
 
-            if product_index < total_products:
-                c.showPage()
+    def poll_render_queue(self):
+        """Applies messages from render_thread, called once per frame from run()"""
+        while True:
+            try:
+                message = self.render_queue.get_nowait()
+            except queue.Empty:
+                return
 
-        c.save()
+            if message[0] == "progress":
+                pages_done, total_pages = message[1:]
+                dpg.set_value("render_progress", pages_done / total_pages)
+                dpg.configure_item("render_progress", overlay=f"{pages_done} / {total_pages} pages")
+            elif message[0] == "cancelled":
+                dpg.configure_item("render_progress_group", show=False)
+                resumable = message[1]
+                dpg.set_value("list_status", "Label generation cancelled" +
+                              (", finished pages are kept for the next run" if resumable else ""))
+            elif message[0] == "error":
+                dpg.configure_item("render_progress_group", show=False)
+                dpg.set_value("list_status", f"Error creating labels: {message[1]}")
+            else:
+                _, output_file, stats = message
+                dpg.configure_item("render_progress_group", show=False)
+                dpg.set_value("list_status", f"Labels created: {os.path.basename(output_file)} ({stats.pages_rendered} pages drawn, {stats.pages_reused} reused, {stats.operators_saved} operators saved)")
+                if stats.timings is not None:
+                    dpg.set_value("list_status", dpg.get_value("list_status") + f"\nTimings: {stats.timings.summary()}")
+                # show_info waits on split_frame, so it has to run as a callback and not inside run()
+                dpg.set_frame_callback(dpg.get_frame_count() + 1, lambda: self.show_info(
+                    "Message Box", "Do you wish to open the generated file?", self.on_selection))
+
+    def cancel_labels(self):
+        if self.render_cancel is not None:
+            self.render_cancel.cancel()
+            dpg.set_value("list_status", "Cancelling...")
+
+    def create_labels_pdf(self, products: List[Product], output_file: str, color_enabled: bool, exp_enable: bool, workers: int = 1, use_template: bool = False,
+                          diff_state: bool = False, stats: Optional[LabelRenderer.RenderStats] = None,
+                          sheet: SheetTemplate = DEFAULT_SHEET, compact: bool = False,
+                          progress: Optional[LabelRenderer.ProgressCallback] = None,
+                          cancel: Optional[LabelRenderer.CancelToken] = None):
+        if workers <= 1:
+            # Pages written this way are always compressed, compact only adds the shared label form
+            use_template = use_template or compact
+            # Drawn in shards that survive a cancel or crash, and only pages whose products
+            # changed since the last run get drawn again
+            job = LabelJobs.LabelJob(products, output_file, LabelRenderer.SALE_STYLE, color_enabled, exp_enable, use_template,
+                                     diff_state, sheet, cancel_token=cancel)
+            job.run(stats, progress, self.page_cache)
+        else:
+            LabelRenderer.create_labels_pdf(products, output_file, LabelRenderer.SALE_STYLE, color_enabled, exp_enable, workers, use_template,
+                                            diff_state, stats, sheet, compact, progress, cancel)
 
     # Helper method for text splitting in the acctual label making
     def split_text(self, text: str, limit: int) -> List[str]:
-        words = text.split()
-        lines = []
-        current_line = []
-        current_length = 0
-
-        for word in words:
-            if current_length + len(word) + len(current_line) <= limit:
-                current_line.append(word)
-                current_length += len(word)
-            else:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-                current_length = len(word)
-
-        if current_line:
-            lines.append(' '.join(current_line))
-        return lines
+        return LabelRenderer.split_text(text, limit)
 
     def export_products(self):
         # Simplified for example - would normally show file dialog
@@ -762,6 +800,7 @@ class LabelMakerApp:
     def run(self):
         dpg.show_viewport()
         while dpg.is_dearpygui_running():
+            self.poll_render_queue()
             dpg.render_dearpygui_frame()
         dpg.destroy_context()
 
@@ -770,4 +809,5 @@ def main():
     app.run()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,183 @@
+import argparse
+import csv
+import dataclasses
+import json
+import multiprocessing
+import sys
+from typing import Dict, Iterator, List, Tuple
+from LabelModel import ColumnarProductModel, Product
+
+
+# Headless entry point for batch label jobs, e.g.
+#   python LabelMakerCLI.py render --csv in.csv --map name=Name,price="Sales Price",upc=Barcode --out labels.pdf
+# Nothing here imports dearpygui, and reportlab is only imported once a render starts
+# so the command line starts fast.
+
+FIELDS = ['name', 'price', 'upc', 'expiration_date']
+
+# (color_enabled, exp_enable) used by LabelMaker.py and LabelMaker2.py
+STYLE_DEFAULTS = {
+    "sale": (False, True),
+    "plain": (True, False),
+}
+
+
+def parse_mapping(text: str) -> Dict[str, str]:
+    mappings = {}
+    for pair in next(csv.reader([text])):
+        field, sep, column = pair.partition("=")
+        field = field.strip()
+        if not sep or field not in FIELDS:
+            raise argparse.ArgumentTypeError(f"bad mapping '{pair}', expected one of {', '.join(FIELDS)}=<column>")
+        mappings[field] = column.strip().strip("\"'")
+
+    missing = [field for field in ['name', 'price', 'upc'] if field not in mappings]
+    if missing:
+        raise argparse.ArgumentTypeError(f"missing mapping for {', '.join(missing)}")
+    return mappings
+
+
+def iter_csv_products(csv_path: str, mappings: Dict[str, str], errors: List[Tuple[int, str]]) -> Iterator[Product]:
+    """
+    Yields one Product per CSV row. Rows that fail to convert are skipped and recorded in
+    errors as (line number, message) instead of stopping the run. The encoding and
+    delimiter are detected the same way as in the GUI import.
+    """
+    from CsvImport import peek_csv
+
+    peek = peek_csv(csv_path)
+    with open(csv_path, newline="", encoding=peek.encoding) as f:
+        reader = csv.DictReader(f, delimiter=peek.delimiter)
+        missing = [column for column in mappings.values() if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"column(s) not found in {csv_path}: {', '.join(missing)}")
+
+        for line_number, row in enumerate(reader, start=2):
+            try:
+                product_data = {field: row[column] for field, column in mappings.items()}
+                yield Product.from_dict(product_data, source="csv")
+            except (ValueError, TypeError) as e:
+                errors.append((line_number, str(e)))
+
+
+def render(args) -> int:
+    import LabelRenderer
+
+    from SheetTemplates import SHEET_TEMPLATES, load_sheet_templates
+
+    sheets = dict(SHEET_TEMPLATES)
+    if args.sheet_file:
+        sheets.update(load_sheet_templates(args.sheet_file))
+    if args.sheet not in sheets:
+        print(f"labelmaker: error: unknown sheet '{args.sheet}', choose from {', '.join(sheets)}", file=sys.stderr)
+        return 2
+    sheet = sheets[args.sheet]
+
+    style = LabelRenderer.SALE_STYLE if args.style == "sale" else LabelRenderer.PLAIN_STYLE
+    if args.barcode is not None:
+        from BarcodeSymbologies import symbology_names
+        if args.barcode not in symbology_names():
+            print(f"labelmaker: error: unknown barcode '{args.barcode}', choose from {', '.join(symbology_names())}",
+                  file=sys.stderr)
+            return 2
+        style = dataclasses.replace(style, barcode=args.barcode)
+    color_enabled, exp_enable = STYLE_DEFAULTS[args.style]
+    if args.color is not None:
+        color_enabled = args.color
+    if args.exp is not None:
+        exp_enable = args.exp
+
+    stats = LabelRenderer.RenderStats(timings=LabelRenderer.PhaseTimer() if args.timings else None)
+    errors: List[Tuple[int, str]] = []
+    products = iter_csv_products(args.csv, args.map, errors)
+
+    try:
+        if args.format == "zpl":
+            import ZplRenderer
+            with ZplRenderer.open_zpl_output(args.out) as out:
+                total_labels = ZplRenderer.write_zpl(products, out, exp_enable)
+        elif args.stream:
+            # the streaming writer always compresses pages and shares fonts, compact only adds the form
+            total_labels = LabelRenderer.stream_labels_pdf(products, args.out, style, color_enabled, exp_enable,
+                                                           args.template or args.compact, args.diff_state, stats,
+                                                           sheet)
+        else:
+            model = ColumnarProductModel()
+            for product in products:
+                model.add_product(product)
+            total_labels = len(model.get_all_products())
+            LabelRenderer.create_labels_pdf(model.get_all_products(), args.out, style, color_enabled, exp_enable,
+                                            args.workers, args.template, args.diff_state, stats, sheet,
+                                            args.compact)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"labelmaker: error: {e}", file=sys.stderr)
+        return 2
+
+    print(f"Rendered {total_labels} labels to {args.out}")
+    if args.diff_state:
+        print(f"{stats.operators_saved} redundant operators skipped")
+    if args.timings:
+        print(json.dumps({"labels": total_labels, "phases": stats.timings.as_dict()}))
+    if args.size_report and args.format == "pdf":
+        if args.stream:
+            print("labelmaker: --size-report needs the products in memory, ignored with --stream", file=sys.stderr)
+        else:
+            report = LabelRenderer.pdf_size_report(model.get_all_products(), args.out, style, color_enabled,
+                                                   exp_enable, sheet)
+            print(json.dumps(report))
+    if errors:
+        for line_number, message in errors:
+            print(f"row {line_number}: {message}", file=sys.stderr)
+        print(f"{len(errors)} row(s) skipped", file=sys.stderr)
+        return 1
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="labelmaker", description="Generate shelf labels without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = commands.add_parser("render", help="render a CSV file to a label PDF or ZPL")
+    render_parser.add_argument("--csv", required=True, help="input CSV file")
+    render_parser.add_argument("--map", required=True, type=parse_mapping,
+                               help='field=column pairs, e.g. name=Name,price="Sales Price",upc=Barcode')
+    render_parser.add_argument("--out", required=True,
+                               help="output file, or tcp://host:port to send ZPL straight to a printer")
+    render_parser.add_argument("--format", choices=["pdf", "zpl"], default="pdf",
+                               help="letter-size PDF sheets or native ZPL for thermal printers (default: pdf)")
+    render_parser.add_argument("--style", choices=sorted(STYLE_DEFAULTS), default="sale",
+                               help="label variant (default: sale)")
+    render_parser.add_argument("--color", action=argparse.BooleanOptionalAction, default=None,
+                               help="draw the colored price box (default depends on --style)")
+    render_parser.add_argument("--exp", action=argparse.BooleanOptionalAction, default=None,
+                               help="print the expiration date (default depends on --style)")
+    render_parser.add_argument("--barcode",
+                               help="barcode symbology for PDF output, e.g. code128, ean13, upca or auto to pick "
+                                    "UPC-A/EAN-13 by UPC length (default: code128)")
+    render_parser.add_argument("--sheet", default="default", help="label sheet template name (default: default)")
+    render_parser.add_argument("--sheet-file", help="JSON file with extra sheet templates")
+    render_parser.add_argument("--workers", type=int, default=1, help="render worker processes (default: 1)")
+    render_parser.add_argument("--template", action="store_true", help="reuse one form for the static label frame")
+    render_parser.add_argument("--diff-state", action="store_true",
+                               help="skip line width, color and font operators that do not change anything")
+    render_parser.add_argument("--timings", action="store_true",
+                               help="print time spent per render phase as JSON (PDF output only)")
+    render_parser.add_argument("--stream", action="store_true",
+                               help="write pages as they are rendered, keeping memory flat on huge files")
+    render_parser.add_argument("--compact", action="store_true",
+                               help="smallest PDF: compressed pages, shared label form, merged duplicate objects")
+    render_parser.add_argument("--size-report", action="store_true",
+                               help="print output size against an uncompressed render as JSON (PDF output only)")
+    render_parser.set_defaults(func=render)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
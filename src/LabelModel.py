@@ -0,0 +1,390 @@
+import math
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Product fields in column order, see ColumnarProductModel
+COLUMNS = ('name', 'price', 'upc', 'expiration_date', 'source')
+
+
+def has_upc(upc: str) -> bool:
+    # An empty CSV cell comes through as the string "nan"
+    return upc.strip() not in ("", "nan")
+
+
+@dataclass(frozen=True, slots=True, init=False)
+class Product:
+    """
+    One product. Frozen and slotted, so there is no __dict__ per product; change a
+    product with ProductModel.replace_product. The price is kept in whole cents (price
+    gives dollars back) and source is interned, so every product shares one "csv" or
+    "manual" string. Give either price or price_cents; dataclasses.replace passes
+    price_cents, and with_price gives a copy at a new price.
+    """
+    name: str
+    price_cents: int
+    upc: str
+    expiration_date: Optional[str] = None
+    source: str = "manual"
+
+    def __init__(self, name: str, price: Optional[float] = None, upc: str = "",
+                 expiration_date: Optional[str] = None, source: str = "manual",
+                 price_cents: Optional[int] = None):
+        if (price is None) == (price_cents is None):
+            raise TypeError("Product takes either price or price_cents")
+        if price_cents is None:
+            if not math.isfinite(price):
+                raise ValueError(f"price must be a number, got {price!r}")
+            price_cents = round(price * 100)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'price_cents', price_cents)
+        object.__setattr__(self, 'upc', upc)
+        object.__setattr__(self, 'expiration_date', expiration_date)
+        object.__setattr__(self, 'source', sys.intern(source))
+
+    @property
+    def price(self) -> float:
+        return self.price_cents / 100
+
+    def with_price(self, price: float) -> 'Product':
+        return Product(self.name, price, self.upc, self.expiration_date, self.source)
+
+    @classmethod
+    def from_dict(cls, data: dict, source: str = "manual") -> 'Product':
+        return cls(
+            name=str(data['name']),
+            price=float(data['price']),
+            upc=str(data['upc']),
+            expiration_date=str(data.get('expiration_date', '')),
+            source=source
+        )
+
+class UpcIndex:
+    """
+    UPC -> position of the first product with that UPC, kept in step with a model's list
+    of UPCs. The model changes the list first and then tells the index what changed.
+    Lookups are a dict get; removing a row is one pass over the index, since every
+    position after it moves down by one. Products without a UPC (see has_upc) are not
+    indexed, so they are never found or replaced by UPC.
+    """
+
+    def __init__(self, upcs: List[str]):
+        self.upcs = upcs
+        self.positions: Dict[str, int] = {}
+
+    def get(self, upc: str) -> Optional[int]:
+        return self.positions.get(upc)
+
+    def added(self, start: int) -> None:
+        # Rows from start on were appended
+        for position in range(start, len(self.upcs)):
+            upc = self.upcs[position]
+            if has_upc(upc):
+                self.positions.setdefault(upc, position)
+
+    def replaced(self, old_upc: str, position: int) -> None:
+        new_upc = self.upcs[position]
+        if new_upc == old_upc:
+            return
+        if self.positions.get(old_upc) == position:
+            self._find_next(old_upc, position + 1)
+        if has_upc(new_upc) and self.positions.get(new_upc, position + 1) > position:
+            self.positions[new_upc] = position
+
+    def removed(self, upc: str, position: int) -> None:
+        was_first = self.positions.get(upc) == position
+        if was_first:
+            del self.positions[upc]
+        self.positions = {key: index - 1 if index > position else index for key, index in self.positions.items()}
+        if was_first:
+            self._find_next(upc, position)
+
+    def cleared(self) -> None:
+        self.positions.clear()
+
+    def _find_next(self, upc: str, start: int) -> None:
+        try:
+            self.positions[upc] = self.upcs.index(upc, start)
+        except ValueError:
+            self.positions.pop(upc, None)
+
+
+class ProductModel:
+    def __init__(self):
+        self.products: List[Product] = []
+        self.upcs: List[str] = []
+        self.upc_index = UpcIndex(self.upcs)
+
+    def add_product(self, product: Product) -> None:
+        if product != "":
+            self.products.append(product)
+            self.upcs.append(product.upc)
+            self.upc_index.added(len(self.upcs) - 1)
+
+    def add_products(self, products: Iterable[Product]) -> None:
+        start = len(self.products)
+        self.products.extend(products)
+        self.upcs.extend(product.upc for product in self.products[start:])
+        self.upc_index.added(start)
+
+    def add_columns(self, columns: Dict[str, Sequence], source: str = "csv") -> None:
+        self.add_products(
+            Product(name, price, upc, expiration_date, source)
+            for name, price, upc, expiration_date in zip(
+                columns['name'], columns['price'], columns['upc'], columns['expiration_date'])
+        )
+
+    def replace_product(self, index: int, product: Product) -> None:
+        old_upc = self.upcs[index]
+        self.products[index] = product
+        self.upcs[index] = product.upc
+        self.upc_index.replaced(old_upc, index)
+
+    def remove_product(self, index: int) -> None:
+        del self.products[index]
+        upc = self.upcs.pop(index)
+        self.upc_index.removed(upc, index)
+
+    def get_by_upc(self, upc: str) -> Optional[Product]:
+        index = self.upc_index.get(upc)
+        return None if index is None else self.products[index]
+
+    def upsert(self, product: Product) -> bool:
+        """
+        Replaces the product with the same UPC, or adds it if there is none or it has no
+        UPC. Returns True if a product was replaced.
+        """
+        index = self.upc_index.get(product.upc)
+        if index is None:
+            self.add_product(product)
+            return False
+        self.replace_product(index, product)
+        return True
+
+    def upsert_columns(self, columns: Dict[str, Sequence], source: str = "csv") -> int:
+        """
+        upsert for every row of add_columns style columns, e.g. a re-imported price file.
+        Returns how many products were replaced.
+        """
+        return sum(
+            self.upsert(Product(name, price, upc, expiration_date, source))
+            for name, price, upc, expiration_date in zip(
+                columns['name'], columns['price'], columns['upc'], columns['expiration_date'])
+        )
+
+    def remove_by_upc(self, upc: str) -> Optional[Product]:
+        """
+        Removes and returns the first product with this UPC, None if there is none
+        """
+        index = self.upc_index.get(upc)
+        if index is None:
+            return None
+        product = self.products[index]
+        self.remove_product(index)
+        return product
+
+    def get_all_products(self) -> List[Product]:
+        return self.products
+
+    def snapshot(self) -> List[Product]:
+        return list(self.products)
+
+    def remove_all_products(self) -> None:
+        self.products.clear()
+        self.upcs.clear()
+        self.upc_index.cleared()
+
+
+class ProductView(Sequence):
+    """
+    Read-only rows [start, stop) of a set of product columns. Slicing gives another view
+    over the same columns without copying them. Reading rows does copy: indexing and
+    iterating build a Product per row (the renderer reads its labels this way), and
+    column() and rows() copy the text fields of the view's rows. A view shares its
+    model's columns, so edits to the model show up in it; ColumnarProductModel.snapshot()
+    gives one that does not change.
+    """
+
+    def __init__(self, columns: Dict[str, Sequence], start: int = 0, stop: Optional[int] = None):
+        self.columns = columns
+        self.start = start
+        self.stop = len(columns['name']) if stop is None else stop
+
+    def __len__(self) -> int:
+        return max(0, self.stop - self.start)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return ProductView(self.columns, self.start + start, self.start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("product index out of range")
+        row = self.start + index
+        columns = self.columns
+        return Product(columns['name'][row], columns['price'][row], columns['upc'][row],
+                       columns['expiration_date'][row], columns['source'][row])
+
+    def __iter__(self) -> Iterator[Product]:
+        columns = [self.columns[column][self.start:self.stop] for column in COLUMNS]
+        for row in zip(*columns):
+            yield Product(*row)
+
+    def column(self, name: str) -> Sequence:
+        """
+        One field for the rows of this view. Prices come as a memoryview of the model's
+        array, the text columns as a new list of those rows. The model can not grow while
+        a price memoryview is alive (array raises BufferError), so do not hold on to one.
+        """
+        if name == 'price':
+            return memoryview(self.columns['price'])[self.start:self.stop]
+        return self.columns[name][self.start:self.stop]
+
+    def rows(self) -> Iterator[tuple]:
+        """
+        (name, price, upc, expiration_date) per row, without building Products
+        """
+        return zip(*(self.column(column) for column in COLUMNS[:4]))
+
+    def __reduce__(self):
+        # Only this view's rows are pickled (e.g. for a render worker), not the whole model
+        columns = {column: self.column(column) for column in COLUMNS}
+        columns['price'] = array('d', columns['price'])
+        return ProductView, (columns,)
+
+    def __repr__(self) -> str:
+        return f"<ProductView of {len(self)} products>"
+
+
+class ColumnarProductModel:
+    """
+    Same interface as ProductModel, but each field is kept in its own column instead of
+    one Product object per product: prices in a float array, the text fields in lists.
+    A big catalog then takes a fraction of the memory (there is no per-product object
+    or __dict__), and get_all_products() returns a ProductView over the columns.
+    """
+
+    def __init__(self):
+        self.columns: Dict[str, Sequence] = {column: array('d') if column == 'price' else []
+                                             for column in COLUMNS}
+        self.upc_index = UpcIndex(self.columns['upc'])
+
+    def __len__(self) -> int:
+        return len(self.columns['name'])
+
+    def add_product(self, product: Product) -> None:
+        if product != "":
+            for column in COLUMNS:
+                self.columns[column].append(getattr(product, column))
+            self.upc_index.added(len(self) - 1)
+
+    def add_products(self, products: Iterable[Product]) -> None:
+        for product in products:
+            self.add_product(product)
+
+    @staticmethod
+    def check_columns(columns: Dict[str, Sequence]) -> int:
+        count = len(columns['name'])
+        for column in COLUMNS[:4]:
+            if len(columns[column]) != count:
+                raise ValueError(f"column '{column}' has {len(columns[column])} values, expected {count}")
+        return count
+
+    def add_columns(self, columns: Dict[str, Sequence], source: str = "csv") -> None:
+        """
+        Appends whole columns at once, e.g. straight from CsvImport.columns_from_dataframe
+        """
+        count = self.check_columns(columns)
+        start = len(self)
+        for column in COLUMNS[:4]:
+            self.columns[column].extend(columns[column])
+        self.columns['source'].extend([sys.intern(source)] * count)
+        self.upc_index.added(start)
+
+    def replace_product(self, index: int, product: Product) -> None:
+        old_upc = self.columns['upc'][index]
+        for column in COLUMNS:
+            self.columns[column][index] = getattr(product, column)
+        self.upc_index.replaced(old_upc, index)
+
+    def remove_product(self, index: int) -> None:
+        upc = self.columns['upc'][index]
+        for column in COLUMNS:
+            del self.columns[column][index]
+        self.upc_index.removed(upc, index)
+
+    def get_by_upc(self, upc: str) -> Optional[Product]:
+        index = self.upc_index.get(upc)
+        return None if index is None else ProductView(self.columns)[index]
+
+    def upsert(self, product: Product) -> bool:
+        """
+        Replaces the product with the same UPC, or adds it if there is none or it has no
+        UPC. Returns True if a product was replaced.
+        """
+        index = self.upc_index.get(product.upc)
+        if index is None:
+            self.add_product(product)
+            return False
+        self.replace_product(index, product)
+        return True
+
+    def upsert_columns(self, columns: Dict[str, Sequence], source: str = "csv") -> int:
+        """
+        upsert for every row of add_columns style columns, e.g. a re-imported price file,
+        in one pass. Returns how many products were replaced.
+        """
+        self.check_columns(columns)
+        source = sys.intern(source)
+        # New UPC -> row to append, a later row with the same UPC wins as it would by upsert.
+        # Rows without a UPC are all kept, keyed by their row number instead.
+        new_rows: Dict[object, int] = {}
+        replaced = 0
+        for row, upc in enumerate(columns['upc']):
+            index = self.upc_index.get(upc)
+            if index is None:
+                if not has_upc(upc):
+                    new_rows[row] = row
+                    continue
+                if upc in new_rows:
+                    replaced += 1
+                new_rows[upc] = row
+                continue
+            for column in COLUMNS[:4]:
+                self.columns[column][index] = columns[column][row]
+            self.columns['source'][index] = source
+            replaced += 1
+
+        # In the order the UPCs first appeared, dicts keep that when a key is set again
+        rows = list(new_rows.values())
+        self.add_columns({column: [columns[column][row] for row in rows] for column in COLUMNS[:4]}, source)
+        return replaced
+
+    def remove_by_upc(self, upc: str) -> Optional[Product]:
+        """
+        Removes and returns the first product with this UPC, None if there is none
+        """
+        index = self.upc_index.get(upc)
+        if index is None:
+            return None
+        product = ProductView(self.columns)[index]
+        self.remove_product(index)
+        return product
+
+    def get_all_products(self) -> ProductView:
+        return ProductView(self.columns)
+
+    def snapshot(self) -> ProductView:
+        """
+        A view over copies of the columns, so later edits do not show up in it
+        """
+        return ProductView({column: values[:] for column, values in self.columns.items()})
+
+    def remove_all_products(self) -> None:
+        for values in self.columns.values():
+            del values[:]
+        self.upc_index.cleared()
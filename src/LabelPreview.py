@@ -0,0 +1,161 @@
+from array import array
+from functools import lru_cache
+from typing import Optional
+from PIL import Image, ImageDraw, ImageFont
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from LabelRenderer import BarcodeCache, LabelStyle, PageCache, draw_label
+from SheetTemplates import DEFAULT_SHEET, SheetTemplate
+
+
+# Low resolution label previews for the GUI. reportlab's own bitmap renderer needs an
+# optional cairo backend, so labels are drawn with Pillow (which reportlab already
+# depends on) through the same small canvas API that StreamingCanvas implements. Text
+# uses whatever Helvetica look-alike is installed, it is for checking the layout and
+# not a print proof.
+
+preview_width = 360
+preview_height = 180
+
+# Previews are drawn on the GUI thread while a render thread may be drawing labels, and
+# a reportlab barcode can only be drawn by one thread at a time (drawOn keeps the canvas
+# on the barcode object), so previews get their own barcodes
+preview_barcodes = BarcodeCache(maxsize=1000)
+
+# Tried in order, Pillow's built-in font is the last resort
+FONT_FILES = {
+    "Helvetica": ["arial.ttf", "Arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf"],
+    "Helvetica-Bold": ["arialbd.ttf", "Arial Bold.ttf", "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf"],
+}
+
+
+@lru_cache(maxsize=64)
+def preview_font(font_name: str, pixel_size: int):
+    for file_name in FONT_FILES.get(font_name, FONT_FILES["Helvetica"]):
+        try:
+            return ImageFont.truetype(file_name, pixel_size)
+        except OSError:
+            continue
+    return ImageFont.load_default(pixel_size)
+
+
+class PreviewCanvas:
+    """
+    Draws onto a Pillow RGBA image. Takes PDF coordinates (points, origin at the bottom
+    left) and scales them by `scale` pixels per point.
+    """
+
+    def __init__(self, width: int, height: int, scale: float):
+        self.image = Image.new("RGBA", (width, height), (255, 255, 255, 255))
+        self.draw = ImageDraw.Draw(self.image)
+        self.scale = scale
+        self.height = height
+
+        self.origin = (0.0, 0.0)
+        self.line_width = 1.0
+        self.fill_color = (0, 0, 0, 255)
+        self.stroke_color = (0, 0, 0, 255)
+        self.font_name = "Helvetica"
+        self.font_size = 12
+        self.state_stack = []
+
+    def _point(self, x: float, y: float):
+        return (self.origin[0] + x) * self.scale, self.height - (self.origin[1] + y) * self.scale
+
+    @staticmethod
+    def _rgba(color):
+        return tuple(int(round(value * 255)) for value in color.rgb()) + (255,)
+
+    # Graphics state
+    def setLineWidth(self, width: float):
+        self.line_width = width
+
+    def setFillColor(self, color):
+        self.fill_color = self._rgba(color)
+
+    def setStrokeColor(self, color):
+        self.stroke_color = self._rgba(color)
+
+    def setFont(self, font_name: str, size: float, leading: Optional[float] = None):
+        self.font_name = font_name
+        self.font_size = size
+
+    def saveState(self):
+        self.state_stack.append((self.origin, self.line_width, self.fill_color, self.stroke_color,
+                                 self.font_name, self.font_size))
+
+    def restoreState(self):
+        (self.origin, self.line_width, self.fill_color, self.stroke_color,
+         self.font_name, self.font_size) = self.state_stack.pop()
+
+    def translate(self, dx: float, dy: float):
+        self.origin = (self.origin[0] + dx, self.origin[1] + dy)
+
+    # Drawing
+    def rect(self, x: float, y: float, width: float, height: float, stroke: int = 1, fill: int = 0):
+        left, top = self._point(x, y + height)
+        right, bottom = self._point(x + width, y)
+        self.draw.rectangle(
+            [left, top, right, bottom],
+            fill=self.fill_color if fill else None,
+            outline=self.stroke_color if stroke else None,
+            width=max(1, round(self.line_width * self.scale)) if stroke else 0,
+        )
+
+    def _text(self, x: float, y: float, text: str, anchor: str):
+        text = str(text)
+        pixel_size = max(1, round(self.font_size * self.scale))
+        font = preview_font(self.font_name, pixel_size)
+        # Shrink stand-in fonts that run wider than Helvetica so the layout stays true
+        width = stringWidth(text, self.font_name, self.font_size) * self.scale
+        text_length = font.getlength(text)
+        if text_length > width > 0:
+            font = preview_font(self.font_name, max(1, int(pixel_size * width / text_length)))
+        self.draw.text(self._point(x, y), text, fill=self.fill_color, font=font, anchor=anchor)
+
+    def drawString(self, x: float, y: float, text: str):
+        self._text(x, y, text, "ls")
+
+    def drawCentredString(self, x: float, y: float, text: str):
+        self._text(x, y, text, "ms")
+
+    def drawRightString(self, x: float, y: float, text: str):
+        self._text(x, y, text, "rs")
+
+
+def render_preview(product, style: LabelStyle, color_enabled: bool, exp_enable: bool,
+                   sheet: SheetTemplate = DEFAULT_SHEET) -> Image.Image:
+    """
+    One label scaled to fit preview_width x preview_height and centred, with a 1pt margin
+    so the border is not cut off
+    """
+    scale = min(preview_width / (sheet.label_width + 2), preview_height / (sheet.label_height + 2))
+    c = PreviewCanvas(preview_width, preview_height, scale)
+    c.translate((preview_width / scale - sheet.label_width - 2) / 2, (preview_height / scale - sheet.label_height - 2) / 2)
+    draw_label(c, product, 1, sheet.label_height + 1, style, color_enabled, exp_enable, None, sheet,
+               preview_barcodes)
+    return c.image
+
+
+def texture_data(image: Image.Image) -> array:
+    # dpg textures take RGBA as floats between 0 and 1. A float array is 4 bytes per
+    # value, a list of Python floats would be about 32.
+    return array('f', [value / 255 for value in image.tobytes()])
+
+
+class PreviewCache(PageCache):
+    """
+    LRU cache of preview texture data (about 1 MB each) keyed by a hash of the product
+    and the settings
+    """
+
+    def __init__(self, maxsize: int = 32):
+        super().__init__(maxsize)
+
+    def preview(self, product, style: LabelStyle, color_enabled: bool, exp_enable: bool,
+                sheet: SheetTemplate = DEFAULT_SHEET) -> array:
+        key = self.page_key([product], (style, color_enabled, exp_enable, sheet))
+        data = self.get(key)
+        if data is None:
+            data = texture_data(render_preview(product, style, color_enabled, exp_enable, sheet))
+            self.put(key, data)
+        return data
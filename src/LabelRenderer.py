@@ -0,0 +1,759 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from time import perf_counter
+from typing import Callable, Iterable, List, Optional, Sequence
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from BarcodeSymbologies import get_encoder, resolve_symbology
+from LabelModel import ProductView
+from SheetTemplates import DEFAULT_SHEET, SheetTemplate
+from StreamingPdf import StreamingCanvas
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # only needed for parallel rendering
+    PdfWriter = None
+
+
+# Layout inside a label, measured from its top left corner. Where the labels sit on the
+# page comes from the sheet template (SheetTemplates.py).
+text_area_width = 1.75 * inch
+price_area_width = 0.75 * inch
+
+# The barcode and "SALE!" start left of the label edge to absorb the barcode quiet zone
+barcode_offset_x = 0.1875 * inch
+
+
+@dataclass(frozen=True)
+class LabelStyle:
+    """
+    The bits that differ between the sale labels (LabelMaker.py) and the plain
+    barcode labels (LabelMaker2.py)
+    """
+    name: str
+    border_fill: object
+    border_stroke: object
+    name_font_size: int
+    exp_font_size: int
+    exp_caption: str
+    price_box_color: object
+    show_sale: bool
+    show_barcode: bool
+    # Name in BarcodeSymbologies.SYMBOLOGIES, or "auto" to pick UPC-A/EAN-13 per product
+    barcode: str = "code128"
+
+
+SALE_STYLE = LabelStyle(
+    name="sale",
+    border_fill=colors.yellow,
+    border_stroke=colors.red,
+    name_font_size=12,
+    exp_font_size=10,
+    exp_caption="Weight",
+    price_box_color=colors.red,
+    show_sale=True,
+    show_barcode=False,
+)
+
+PLAIN_STYLE = LabelStyle(
+    name="plain",
+    border_fill=None,
+    border_stroke=colors.black,
+    name_font_size=11,
+    exp_font_size=6,
+    exp_caption="EXP",
+    price_box_color=colors.yellow,
+    show_sale=False,
+    show_barcode=True,
+)
+
+
+def encode_once(barcode):
+    """
+    reportlab's barcode flowables validate, encode and measure themselves again on every
+    draw() and every .width lookup. Do it once here and keep the result, so a cached
+    barcode only has to be drawn.
+    """
+    if hasattr(barcode, "_calculate"):
+        barcode._calculate()
+        barcode._calculate = lambda: None
+    return barcode
+
+
+class BarcodeCache:
+    """
+    LRU cache of built barcode widgets keyed by (symbology, value, barHeight, barWidth).
+    Every cached widget has been through encode_once, so it already holds its bar
+    pattern and repeat print runs of the same UPCs skip the encoding step.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # The LRU order is shared state; drawing a barcode from two threads at once is
+        # not safe either, so each thread that draws should have its own cache
+        self.lock = threading.Lock()
+
+    def get(self, symbology: str, value: str, bar_height: float, bar_width: float):
+        symbology = resolve_symbology(symbology, value)
+        key = (symbology, value, bar_height, bar_width)
+        with self.lock:
+            barcode = self.entries.get(key)
+            if barcode is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return barcode
+            self.misses += 1
+
+        barcode = encode_once(get_encoder(symbology, bar_height, bar_width)(value))
+        with self.lock:
+            self.entries[key] = barcode
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return barcode
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> str:
+        return f"barcode cache: {self.hits} hits, {self.misses} misses, {len(self.entries)} cached"
+
+
+# Shared by every render in this process, so it lives as long as the app session. The
+# GUI preview draws with its own (LabelPreview.preview_barcodes).
+# Worker processes used for parallel rendering each get their own copy.
+barcode_cache = BarcodeCache()
+
+
+class PhaseTimer:
+    """
+    Cumulative time and call counts per render phase. Phases nest exclusively: time spent
+    in an inner phase (e.g. the bars drawn by a barcode) is not counted again in the outer one.
+    """
+    phases = ("wrap", "barcode", "draw_text", "draw_shapes", "page_break", "save")
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(self.phases, 0.0)
+        self.calls = dict.fromkeys(self.phases, 0)
+        self._stack = []
+
+    def start(self, phase: str):
+        now = perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.seconds[outer[0]] += now - outer[1]
+        self._stack.append([phase, now])
+        self.calls[phase] += 1
+
+    def stop(self):
+        now = perf_counter()
+        phase, started = self._stack.pop()
+        self.seconds[phase] += now - started
+        if self._stack:
+            self._stack[-1][1] = now
+
+    def merge(self, other: 'PhaseTimer'):
+        for phase in self.phases:
+            self.seconds[phase] += other.seconds[phase]
+            self.calls[phase] += other.calls[phase]
+
+    def as_dict(self) -> dict:
+        return {phase: {"seconds": round(self.seconds[phase], 4), "calls": self.calls[phase]} for phase in self.phases}
+
+    def summary(self) -> str:
+        return ", ".join(f"{phase} {self.seconds[phase]:.2f}s/{self.calls[phase]}" for phase in self.phases)
+
+
+@dataclass
+class RenderStats:
+    """
+    Counters filled in by a render run, pass one in to collect them. Set timings to a
+    PhaseTimer to also time each render phase.
+    """
+    operators_saved: int = 0
+    pages_rendered: int = 0
+    pages_reused: int = 0
+    timings: Optional[PhaseTimer] = field(default=None, compare=False)
+
+    def merge(self, other: 'RenderStats'):
+        self.operators_saved += other.operators_saved
+        self.pages_rendered += other.pages_rendered
+        self.pages_reused += other.pages_reused
+        if self.timings is not None and other.timings is not None:
+            self.timings.merge(other.timings)
+
+
+class TimingCanvas:
+    """
+    Wrapper that charges the time of each drawing call on the wrapped canvas to its
+    phase in a PhaseTimer. draw_label finds the timer through phase_timer to time text
+    wrapping and barcodes too.
+    """
+
+    def __init__(self, canv, timer: PhaseTimer):
+        self._canv = canv
+        self.phase_timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._canv, name)
+
+    def _timed(self, phase: str, method, *args, **kwargs):
+        self.phase_timer.start(phase)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self.phase_timer.stop()
+
+    def drawString(self, *args, **kwargs):
+        return self._timed("draw_text", self._canv.drawString, *args, **kwargs)
+
+    def drawCentredString(self, *args, **kwargs):
+        return self._timed("draw_text", self._canv.drawCentredString, *args, **kwargs)
+
+    def drawRightString(self, *args, **kwargs):
+        return self._timed("draw_text", self._canv.drawRightString, *args, **kwargs)
+
+    def rect(self, *args, **kwargs):
+        return self._timed("draw_shapes", self._canv.rect, *args, **kwargs)
+
+    def doForm(self, *args, **kwargs):
+        return self._timed("draw_shapes", self._canv.doForm, *args, **kwargs)
+
+    def showPage(self):
+        return self._timed("page_break", self._canv.showPage)
+
+    def take_page(self):
+        return self._timed("page_break", self._canv.take_page)
+
+    def add_page(self, *args):
+        return self._timed("page_break", self._canv.add_page, *args)
+
+    def save(self):
+        return self._timed("save", self._canv.save)
+
+
+class StateCanvas:
+    """
+    Thin wrapper around a canvas that only forwards line width, color and font changes
+    when the value actually differs from the current graphics state, counting the
+    operators it drops. Everything else is passed straight through.
+    """
+
+    def __init__(self, canv):
+        self._canv = canv
+        self._state = {}
+        self._stack = []
+        self.operators_saved = 0
+
+    def __getattr__(self, name):
+        return getattr(self._canv, name)
+
+    def _changed(self, key: str, value) -> bool:
+        if key in self._state and self._state[key] == value:
+            self.operators_saved += 1
+            return False
+        self._state[key] = value
+        return True
+
+    def setLineWidth(self, width: float):
+        if self._changed("line_width", width):
+            self._canv.setLineWidth(width)
+
+    def setFillColor(self, color):
+        if self._changed("fill_color", color):
+            self._canv.setFillColor(color)
+
+    def setStrokeColor(self, color):
+        if self._changed("stroke_color", color):
+            self._canv.setStrokeColor(color)
+
+    def setFont(self, font_name: str, size: float, leading: Optional[float] = None):
+        if self._changed("font", (font_name, size, leading)):
+            self._canv.setFont(font_name, size, leading)
+
+    def saveState(self):
+        self._stack.append(dict(self._state))
+        self._canv.saveState()
+
+    def restoreState(self):
+        self._state = self._stack.pop()
+        self._canv.restoreState()
+
+    def beginForm(self, *args, **kwargs):
+        # A form starts from the default graphics state
+        self._stack.append(self._state)
+        self._state = {}
+        self._canv.beginForm(*args, **kwargs)
+
+    def endForm(self):
+        self._canv.endForm()
+        self._state = self._stack.pop()
+
+    def showPage(self):
+        self._canv.showPage()
+        self._state = {}
+
+
+def wrap_canvas(c, diff_state: bool, stats: Optional[RenderStats] = None):
+    if stats is not None and stats.timings is not None:
+        c = TimingCanvas(c, stats.timings)
+    return StateCanvas(c) if diff_state else c
+
+
+def finish_canvas(c, stats: Optional[RenderStats]):
+    c.save()
+    if stats is not None and isinstance(c, StateCanvas):
+        stats.operators_saved += c.operators_saved
+
+
+class PageCache:
+    """
+    LRU cache of finished pages (encoded content stream plus the fonts it uses) keyed by
+    a hash of the products on the page and every setting that changes how they are drawn
+    """
+
+    def __init__(self, maxsize: int = 2000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def page_key(page_products: Sequence, settings: tuple) -> str:
+        if isinstance(page_products, ProductView):
+            # Straight from the columns, no Product objects needed
+            content = list(page_products.rows())
+        else:
+            content = [(p.name, p.price, p.upc, p.expiration_date) for p in page_products]
+        return hashlib.sha1(repr((settings, content)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        page = self.entries.get(key)
+        if page is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return page
+
+    def put(self, key: str, page):
+        self.entries[key] = page
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Helper method for text splitting in the acctual label making
+def split_text(text: str, limit: int) -> List[str]:
+    words = text.split()
+    lines = []
+    current_line = []
+    current_length = 0
+
+    for word in words:
+        if current_length + len(word) + len(current_line) <= limit:
+            current_line.append(word)
+            current_length += len(word)
+        else:
+            lines.append(' '.join(current_line))
+            current_line = [word]
+            current_length = len(word)
+
+    if current_line:
+        lines.append(' '.join(current_line))
+    return lines
+
+
+@lru_cache(maxsize=65536)
+def word_width(word: str, font_name: str, font_size: float) -> float:
+    return stringWidth(word, font_name, font_size)
+
+
+@lru_cache(maxsize=16384)
+def wrap_text(text: str, font_name: str, font_size: float, box_width: float) -> tuple:
+    """
+    Greedy word wrap using the real glyph widths of the font. Words are measured once
+    per (font, size) and whole results are cached, so names repeated across stores and
+    reprints cost a dictionary lookup. A single word wider than the box gets its own line.
+    """
+    space_width = word_width(" ", font_name, font_size)
+    lines = []
+    current_line = []
+    current_width = 0
+
+    for word in text.split():
+        width = word_width(word, font_name, font_size)
+        if current_line and current_width + space_width + width > box_width:
+            lines.append(' '.join(current_line))
+            current_line = [word]
+            current_width = width
+        elif current_line:
+            current_line.append(word)
+            current_width += space_width + width
+        else:
+            current_line = [word]
+            current_width = width
+
+    if current_line:
+        lines.append(' '.join(current_line))
+    return tuple(lines)
+
+
+def draw_label_frame(c, x: float, y: float, style: LabelStyle, color_enabled: bool,
+                     sheet: SheetTemplate = DEFAULT_SHEET):
+    """
+    Draws the parts of a label that are the same for every product
+    """
+    # Draw label border
+    c.setLineWidth(0.5)
+    c.setStrokeColor(style.border_stroke)
+    if style.border_fill is not None:
+        c.setFillColor(style.border_fill)
+        c.rect(x, y - sheet.label_height, sheet.label_width, sheet.label_height, fill=True)
+    else:
+        c.rect(x, y - sheet.label_height, sheet.label_width, sheet.label_height)
+
+    if style.show_sale:
+        c.setFillColor(colors.red)
+        c.setFont("Helvetica-Bold", 28)  #let users decide with a settigns pannel
+        c.drawString(x - barcode_offset_x + 14, y - sheet.label_height + 5, "SALE!")
+
+    price_x_position = x + text_area_width-15
+    price_y_position = y - 65
+
+    if color_enabled:
+        c.setFillColor(style.price_box_color)
+        c.rect(price_x_position-10, price_y_position-7, price_area_width+25, 30, fill=True)
+
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", 14)
+    dollarsign = f"$"
+    c.drawString(price_x_position-8, price_y_position-2, dollarsign)
+
+
+def define_label_form(c, style: LabelStyle, color_enabled: bool, sheet: SheetTemplate = DEFAULT_SHEET) -> str:
+    """
+    Records the static label frame once as a form XObject with its origin at the
+    bottom left corner of the label
+    """
+    form_name = f"LabelFrame_{style.name}_{int(color_enabled)}_{sheet.name}"
+    # Pad the bounding box so the outer half of the border stroke is not clipped
+    c.beginForm(form_name, lowerx=-1, lowery=-1, upperx=sheet.label_width + 1, uppery=sheet.label_height + 1)
+    draw_label_frame(c, 0, sheet.label_height, style, color_enabled, sheet)
+    c.endForm()
+    return form_name
+
+
+def draw_label(c, product, x: float, y: float, style: LabelStyle, color_enabled: bool, exp_enable: bool,
+               form_name: Optional[str] = None, sheet: SheetTemplate = DEFAULT_SHEET,
+               barcodes: Optional[BarcodeCache] = None):
+    product_name = str(product.name)
+
+    if form_name is None:
+        draw_label_frame(c, x, y, style, color_enabled, sheet)
+    else:
+        c.saveState()
+        c.translate(x, y - sheet.label_height)
+        c.doForm(form_name)
+        c.restoreState()
+
+    # Draw product name
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", style.name_font_size)
+
+    timer = getattr(c, "phase_timer", None)
+    if timer is not None:
+        timer.start("wrap")
+    product_name_lines = wrap_text(product_name, "Helvetica-Bold", style.name_font_size, sheet.label_width - 10)
+    if timer is not None:
+        timer.stop()
+
+    for line_index, line in enumerate(product_name_lines):
+        c.drawString(x + 5, y - 15 - (line_index * 10), line)
+
+    # Draw expiration date if enabled
+    if exp_enable:
+        c.setFont("Helvetica", style.exp_font_size)
+        expiration_date = str(product.expiration_date if product.expiration_date else 'N/A')
+        c.drawString(x + 5, y - 35, f"{style.exp_caption}: {expiration_date}")
+
+    # Draw barcode
+    if style.show_barcode:
+        barcode_x_position = x - barcode_offset_x
+        barcode_y_position = y - sheet.label_height + 5
+        if timer is not None:
+            timer.start("barcode")
+        barcode_value = str(product.upc)
+        barcode = (barcodes or barcode_cache).get(style.barcode, barcode_value, sheet.label_height / 3, .75)
+        barcode.drawOn(c, barcode_x_position, barcode_y_position)
+        if timer is not None:
+            timer.stop()
+
+    # Draw price
+    price_x_position = x + text_area_width-15
+    price_y_position = y - 65
+
+    c.setFillColor(colors.black)
+    c.setFont("Helvetica-Bold", 24)  #let users decide with a settigns pannel
+    price_value = f"{product.price:.2f}"
+    c.drawString(price_x_position+1, price_y_position-2, price_value)
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """
+    Set from any thread to stop a render. Renderers given a token check it between labels
+    and raise RenderCancelled. The flag is a multiprocessing Event, so the worker
+    processes of a parallel render see it too.
+    """
+
+    def __init__(self, event=None):
+        self._event = event or multiprocessing.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise RenderCancelled("label rendering was cancelled")
+
+
+def draw_page(c, page_products: Sequence, style: LabelStyle, color_enabled: bool, exp_enable: bool,
+              form_name: Optional[str] = None, sheet: SheetTemplate = DEFAULT_SHEET,
+              cancel: Optional[CancelToken] = None):
+    for (x, y), product in zip(sheet.slots, page_products):
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        draw_label(c, product, x, y, style, color_enabled, exp_enable, form_name, sheet)
+
+
+# Called as progress(pages_done, total_pages) after every finished page, or after every
+# merged shard when rendering in parallel. Runs on the rendering thread.
+ProgressCallback = Callable[[int, int], None]
+
+
+def page_count(products: Sequence, sheet: SheetTemplate = DEFAULT_SHEET) -> int:
+    return -(-len(products) // sheet.labels_per_page)
+
+
+def draw_labels(c, products: Sequence, style: LabelStyle, color_enabled: bool, exp_enable: bool,
+                use_template: bool = False, sheet: SheetTemplate = DEFAULT_SHEET,
+                progress: Optional[ProgressCallback] = None, cancel: Optional[CancelToken] = None):
+    form_name = define_label_form(c, style, color_enabled, sheet) if use_template else None
+
+    labels_per_page = sheet.labels_per_page
+    total_pages = page_count(products, sheet)
+    for start in range(0, len(products), labels_per_page):
+        if start:
+            c.showPage()
+        draw_page(c, products[start:start + labels_per_page], style, color_enabled, exp_enable, form_name, sheet,
+                  cancel)
+        if progress is not None:
+            progress(start // labels_per_page + 1, total_pages)
+
+
+# Pages per shard when rendering in parallel. Small shards keep every worker busy to the
+# end and leave queued shards for a cancel to drop.
+SHARD_PAGES = 10
+
+# The cancel token of the render a worker process belongs to, see init_shard_worker
+shard_cancel: Optional[CancelToken] = None
+
+
+def init_shard_worker(event):
+    # Events can only reach a worker process when it starts, not with each shard
+    global shard_cancel
+    shard_cancel = CancelToken(event) if event is not None else None
+
+
+def render_shard(products: Sequence, style: LabelStyle, color_enabled: bool, exp_enable: bool,
+                 use_template: bool = False, diff_state: bool = False, sheet: SheetTemplate = DEFAULT_SHEET,
+                 timed: bool = False, compact: bool = False):
+    """
+    Renders one page-aligned shard to an in-memory PDF. Runs inside a worker process.
+    """
+    buffer = io.BytesIO()
+    stats = RenderStats(timings=PhaseTimer() if timed else None)
+    c = wrap_canvas(canvas.Canvas(buffer, pagesize=sheet.pagesize, pageCompression=1 if compact else None),
+                    diff_state, stats)
+    draw_labels(c, products, style, color_enabled, exp_enable, use_template, sheet, cancel=shard_cancel)
+    finish_canvas(c, stats)
+    return buffer.getvalue(), stats
+
+
+def shard_products(products: Sequence, labels_per_page: int, pages_per_shard: int = SHARD_PAGES) -> List[Sequence]:
+    """
+    Splits the products into shards of pages_per_shard pages, every shard except the
+    last holding a whole number of pages so the merged layout matches the serial one
+    """
+    shard_size = max(1, pages_per_shard) * labels_per_page
+    return [products[start:start + shard_size] for start in range(0, len(products), shard_size)]
+
+
+def create_labels_pdf(products: Sequence, output_file: str, style: LabelStyle,
+                      color_enabled: bool, exp_enable: bool, workers: int = 1, use_template: bool = False,
+                      diff_state: bool = False, stats: Optional[RenderStats] = None,
+                      sheet: SheetTemplate = DEFAULT_SHEET, compact: bool = False,
+                      progress: Optional[ProgressCallback] = None, cancel: Optional[CancelToken] = None):
+    """
+    compact forces Flate page compression and the shared label form, and when shards
+    are merged also folds their identical fonts and forms back into one copy each.
+    A cancelled run raises RenderCancelled before anything is written to output_file.
+    In parallel, shards still queued are dropped and the running ones stop at their
+    next label.
+    """
+    use_template = use_template or compact
+    if workers <= 1 or len(products) <= sheet.labels_per_page:
+        c = wrap_canvas(canvas.Canvas(output_file, pagesize=sheet.pagesize, pageCompression=1 if compact else None),
+                        diff_state, stats)
+        draw_labels(c, products, style, color_enabled, exp_enable, use_template, sheet, progress, cancel)
+        finish_canvas(c, stats)
+        return
+
+    if PdfWriter is None:
+        raise RuntimeError("Parallel rendering needs pypdf (pip install pypdf)")
+
+    # Shards of a ProductView are views too, and only pickle their own rows
+    shards = shard_products(products, sheet.labels_per_page)
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)), initializer=init_shard_worker,
+                             initargs=(cancel._event if cancel is not None else None,)) as pool:
+        futures = [pool.submit(render_shard, shard, style, color_enabled, exp_enable, use_template, diff_state,
+                               sheet, stats is not None and stats.timings is not None, compact)
+                   for shard in shards]
+
+        # Merge in submission order so pages keep the product order
+        writer = PdfWriter()
+        total_pages = page_count(products, sheet)
+        try:
+            for future in futures:
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                shard_pdf, shard_stats = future.result()
+                writer.append(io.BytesIO(shard_pdf))
+                if stats is not None:
+                    stats.merge(shard_stats)
+                if progress is not None:
+                    progress(len(writer.pages), total_pages)
+        except BaseException:
+            # Leaving the with block waits for the workers, so do not start any more shards
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    timer = stats.timings if stats is not None else None
+    if timer is not None:
+        timer.start("save")
+    if compact:
+        writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    with open(output_file, "wb") as f:
+        writer.write(f)
+    if timer is not None:
+        timer.stop()
+
+
+def stream_labels_pdf(products: Iterable, output_file: str, style: LabelStyle,
+                      color_enabled: bool, exp_enable: bool, use_template: bool = False,
+                      diff_state: bool = False, stats: Optional[RenderStats] = None,
+                      sheet: SheetTemplate = DEFAULT_SHEET) -> int:
+    """
+    Renders labels from any iterable of products (e.g. a generator over a chunked CSV
+    read) one page at a time, writing each compressed page straight to disk so memory
+    does not grow with the catalog size. Returns the number of labels written.
+    """
+    c = wrap_canvas(StreamingCanvas(output_file, pagesize=sheet.pagesize, pageCompression=1), diff_state, stats)
+    form_name = define_label_form(c, style, color_enabled, sheet) if use_template else None
+
+    labels_per_page = sheet.labels_per_page
+    products = iter(products)
+    total_labels = 0
+    page_products = list(islice(products, labels_per_page))
+    while page_products:
+        draw_page(c, page_products, style, color_enabled, exp_enable, form_name, sheet)
+        total_labels += len(page_products)
+
+        page_products = list(islice(products, labels_per_page))
+        if page_products:
+            c.showPage()
+
+    finish_canvas(c, stats)
+    return total_labels
+
+
+def render_page(c, page_products: Sequence, style: LabelStyle, color_enabled: bool, exp_enable: bool,
+                form_name: Optional[str] = None, sheet: SheetTemplate = DEFAULT_SHEET,
+                page_cache: Optional[PageCache] = None, diff_state: bool = False,
+                stats: Optional[RenderStats] = None, cancel: Optional[CancelToken] = None):
+    """
+    Draws one page on a StreamingCanvas and returns it as take_page() does, without
+    adding it to the document. With a page_cache, a page already drawn from the same
+    products and settings is returned from the cache instead.
+    """
+    key = None
+    if page_cache is not None:
+        settings = (style, color_enabled, exp_enable, form_name is not None, diff_state, sheet)
+        key = page_cache.page_key(page_products, settings)
+        page = page_cache.get(key)
+        if page is not None:
+            if stats is not None:
+                stats.pages_reused += 1
+            return page
+
+    page_canvas = StateCanvas(c) if diff_state else c
+    draw_page(page_canvas, page_products, style, color_enabled, exp_enable, form_name, sheet, cancel)
+    page = c.take_page()
+    if page_cache is not None:
+        page_cache.put(key, page)
+    if stats is not None:
+        stats.pages_rendered += 1
+        if isinstance(page_canvas, StateCanvas):
+            stats.operators_saved += page_canvas.operators_saved
+    return page
+
+
+def pdf_size_report(products: Sequence, output_file: str, style: LabelStyle, color_enabled: bool,
+                    exp_enable: bool, sheet: SheetTemplate = DEFAULT_SHEET) -> dict:
+    """
+    Compares output_file against the same labels drawn with an uncompressed canvas and no
+    shared label form. Renders that baseline to a temporary file, so it costs a second run.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline_file = os.path.join(tmp, "baseline.pdf")
+        c = canvas.Canvas(baseline_file, pagesize=sheet.pagesize, pageCompression=0)
+        draw_labels(c, products, style, color_enabled, exp_enable, False, sheet)
+        c.save()
+        baseline_bytes = os.path.getsize(baseline_file)
+
+    output_bytes = os.path.getsize(output_file)
+    return {
+        "baseline_bytes": baseline_bytes,
+        "output_bytes": output_bytes,
+        "saved_bytes": baseline_bytes - output_bytes,
+        "ratio": round(output_bytes / baseline_bytes, 3) if baseline_bytes else None,
+    }
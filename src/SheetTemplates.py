@@ -0,0 +1,74 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+from reportlab.lib.units import inch
+
+
+# Label sheet geometry. Presets live in SheetTemplates.json (all sizes in inches) and
+# more can be loaded from any JSON file with the same layout.
+TEMPLATES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SheetTemplates.json")
+
+
+@dataclass(frozen=True)
+class SheetTemplate:
+    name: str
+    label_width: float
+    label_height: float
+    columns: int
+    rows: int
+    left_margin: float
+    top_margin: float
+    spacing_x: float
+    spacing_y: float
+    page_width: float = 8.5 * inch
+    page_height: float = 11 * inch
+    description: str = ""
+
+    # Top left corner of every label on a page, in fill order. Computed once so the
+    # renderer only indexes into it.
+    slots: Tuple[Tuple[float, float], ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        slots = tuple(
+            (self.left_margin + j * (self.label_width + self.spacing_x),
+             self.page_height - self.top_margin - i * (self.label_height + self.spacing_y))
+            for i in range(self.rows)
+            for j in range(self.columns)
+        )
+        object.__setattr__(self, "slots", slots)
+
+    @property
+    def labels_per_page(self) -> int:
+        return len(self.slots)
+
+    @property
+    def pagesize(self) -> Tuple[float, float]:
+        return (self.page_width, self.page_height)
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict) -> 'SheetTemplate':
+        return cls(
+            name=name,
+            label_width=float(data['label_width']) * inch,
+            label_height=float(data['label_height']) * inch,
+            columns=int(data['columns']),
+            rows=int(data['rows']),
+            left_margin=float(data['left_margin']) * inch,
+            top_margin=float(data['top_margin']) * inch,
+            spacing_x=float(data.get('spacing_x', 0)) * inch,
+            spacing_y=float(data.get('spacing_y', 0)) * inch,
+            page_width=float(data.get('page_width', 8.5)) * inch,
+            page_height=float(data.get('page_height', 11)) * inch,
+            description=str(data.get('description', '')),
+        )
+
+
+def load_sheet_templates(path: str = TEMPLATES_FILE) -> Dict[str, SheetTemplate]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {name: SheetTemplate.from_dict(name, values) for name, values in data.items()}
+
+
+SHEET_TEMPLATES = load_sheet_templates()
+DEFAULT_SHEET = SHEET_TEMPLATES["default"]
@@ -0,0 +1,208 @@
+import zlib
+from typing import FrozenSet, List, Optional, Tuple
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.rl_accel import fp_str
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+
+def escape_text(text: str) -> bytes:
+    encoded = str(text).encode("cp1252", "replace")
+    return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+class StreamingCanvas:
+    """
+    A write-through stand-in for reportlab's canvas.Canvas.
+
+    reportlab keeps every page in memory until save(), this writes each page to the
+    file (Flate compressed) as soon as showPage() is called, so memory stays flat no
+    matter how many pages are written. Only the part of the canvas API used by the
+    label renderer and reportlab's barcode widgets is supported, with the standard
+    14 PDF fonts.
+    """
+
+    def __init__(self, output_file: str, pagesize=letter, pageCompression: int = 1):
+        self.file = open(output_file, "wb")
+        self.pagesize = pagesize
+        self.page_compression = pageCompression
+
+        self.offsets: List[Optional[int]] = []
+        self.catalog_id = self._allocate()
+        self.pages_id = self._allocate()
+        self.resources_id = self._allocate()
+        self.page_ids: List[int] = []
+
+        self.fonts = {}  # font name -> (resource name, object id)
+        self.page_fonts = set()  # fonts used on the current page
+        self.forms = {}  # form name -> (resource name, object id)
+
+        self.code: List[str] = []
+        self.page_code: Optional[List[str]] = None  # parked while a form is recorded
+        self.form_name = None
+        self.form_bbox = None
+        self.font_name = "Helvetica"
+        self.font_size = 12
+        self.state_stack = []
+
+        self.file.write(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+
+    # Low level object writing
+    def _allocate(self) -> int:
+        self.offsets.append(None)
+        return len(self.offsets)
+
+    def _write_object(self, obj_id: int, body: bytes):
+        self.offsets[obj_id - 1] = self.file.tell()
+        self.file.write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    def _encode(self, code: List[str]) -> bytes:
+        content = "\n".join(code).encode("latin-1")
+        return zlib.compress(content) if self.page_compression else content
+
+    def _write_stream(self, obj_id: int, data: bytes, extra: str = ""):
+        if self.page_compression:
+            extra += " /Filter /FlateDecode"
+        head = f"<< /Length {len(data)}{extra} >>\nstream\n".encode("latin-1")
+        self._write_object(obj_id, head + data + b"\nendstream")
+
+    def _font_resource(self, font_name: str) -> str:
+        # Resource names come from the font name so a page's content stream means the
+        # same thing in any document written by this class (see take_page/add_page)
+        if font_name not in self.fonts:
+            self.fonts[font_name] = (f"F.{font_name}", self._allocate())
+        self.page_fonts.add(font_name)
+        return self.fonts[font_name][0]
+
+    # Graphics state
+    def setLineWidth(self, width: float):
+        self.code.append(f"{fp_str(width)} w")
+
+    def setFillColor(self, color):
+        self.code.append(f"{fp_str(*color.rgb())} rg")
+
+    def setStrokeColor(self, color):
+        self.code.append(f"{fp_str(*color.rgb())} RG")
+
+    def setFont(self, font_name: str, size: float, leading: Optional[float] = None):
+        self.font_name = font_name
+        self.font_size = size
+
+    def saveState(self):
+        self.state_stack.append((self.font_name, self.font_size))
+        self.code.append("q")
+
+    def restoreState(self):
+        self.font_name, self.font_size = self.state_stack.pop()
+        self.code.append("Q")
+
+    def translate(self, dx: float, dy: float):
+        self.code.append(f"1 0 0 1 {fp_str(dx, dy)} cm")
+
+    # Drawing
+    def rect(self, x: float, y: float, width: float, height: float, stroke: int = 1, fill: int = 0):
+        op = {(1, 1): "B", (0, 1): "f", (1, 0): "S", (0, 0): "n"}[(int(bool(stroke)), int(bool(fill)))]
+        self.code.append(f"{fp_str(x, y, width, height)} re {op}")
+
+    def drawString(self, x: float, y: float, text: str):
+        font = self._font_resource(self.font_name)
+        self.code.append(
+            f"BT /{font} {fp_str(self.font_size)} Tf 1 0 0 1 {fp_str(x, y)} Tm ("
+            + escape_text(text).decode("latin-1") + ") Tj ET"
+        )
+
+    def drawCentredString(self, x: float, y: float, text: str):
+        self.drawString(x - stringWidth(text, self.font_name, self.font_size) / 2, y, text)
+
+    def drawRightString(self, x: float, y: float, text: str):
+        self.drawString(x - stringWidth(text, self.font_name, self.font_size), y, text)
+
+    # Forms
+    def beginForm(self, name: str, lowerx: float = 0, lowery: float = 0,
+                  upperx: Optional[float] = None, uppery: Optional[float] = None):
+        width, height = self.pagesize
+        self.form_bbox = (lowerx, lowery, width if upperx is None else upperx, height if uppery is None else uppery)
+        self.forms[name] = (f"FormXob.{name}", self._allocate())
+        self.page_code, self.code = self.code, []
+        self.form_name = name
+
+    def endForm(self):
+        obj_id = self.forms[self.form_name][1]
+        self._write_stream(
+            obj_id, self._encode(self.code),
+            f" /Type /XObject /Subtype /Form /BBox [{fp_str(*self.form_bbox)}] /Resources {self.resources_id} 0 R",
+        )
+        self.code, self.page_code = self.page_code, None
+        self.form_name = None
+
+    def doForm(self, name: str):
+        self.code.append(f"/{self.forms[name][0]} Do")
+
+    # Pages
+    def take_page(self) -> Tuple[bytes, FrozenSet[str]]:
+        """
+        Ends the current page without writing it and returns its encoded content stream
+        and the fonts it uses, to be passed to add_page, possibly on another canvas with
+        the same compression setting.
+        """
+        page = (self._encode(self.code), frozenset(self.page_fonts))
+        self.code = []
+        self.page_fonts = set()
+        self.state_stack = []
+        self.font_name, self.font_size = "Helvetica", 12
+        return page
+
+    def add_page(self, content: bytes, fonts: FrozenSet[str]):
+        for font_name in fonts:
+            self._font_resource(font_name)
+        self.page_fonts = set()
+
+        contents_id = self._allocate()
+        self._write_stream(contents_id, content)
+
+        page_id = self._allocate()
+        width, height = self.pagesize
+        self._write_object(page_id, (
+            f"<< /Type /Page /Parent {self.pages_id} 0 R /MediaBox [0 0 {fp_str(width, height)}]"
+            f" /Resources {self.resources_id} 0 R /Contents {contents_id} 0 R >>"
+        ).encode("latin-1"))
+        self.page_ids.append(page_id)
+
+    def showPage(self):
+        self.add_page(*self.take_page())
+
+    def close(self):
+        """
+        Closes the file without finishing the document, e.g. when a render is abandoned
+        """
+        self.file.close()
+
+    def save(self):
+        if self.code or not self.page_ids:
+            self.showPage()
+
+        for font_name, (_, obj_id) in self.fonts.items():
+            self._write_object(obj_id, (
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{font_name} /Encoding /WinAnsiEncoding >>"
+            ).encode("latin-1"))
+
+        fonts = " ".join(f"/{res} {obj_id} 0 R" for res, obj_id in self.fonts.values())
+        forms = " ".join(f"/{res} {obj_id} 0 R" for res, obj_id in self.forms.values())
+        self._write_object(self.resources_id, (
+            f"<< /ProcSet [/PDF /Text] /Font << {fonts} >> /XObject << {forms} >> >>"
+        ).encode("latin-1"))
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.page_ids)
+        self._write_object(self.pages_id, (
+            f"<< /Type /Pages /Count {len(self.page_ids)} /Kids [{kids}] >>"
+        ).encode("latin-1"))
+        self._write_object(self.catalog_id, f"<< /Type /Catalog /Pages {self.pages_id} 0 R >>".encode("latin-1"))
+
+        xref_offset = self.file.tell()
+        self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.offsets) + 1))
+        for offset in self.offsets:
+            self.file.write(b"%010d 00000 n \n" % offset)
+        self.file.write((
+            f"trailer\n<< /Size {len(self.offsets) + 1} /Root {self.catalog_id} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n"
+        ).encode("latin-1"))
+        self.file.close()
@@ -0,0 +1,82 @@
+import socket
+from contextlib import contextmanager
+from typing import Iterable, Iterator, TextIO
+from LabelRenderer import wrap_text
+
+
+# Native ZPL output for Zebra thermal printers. Each label is a few hundred bytes of
+# text and the barcode is drawn by the printer itself (^BC Code128), so nothing is
+# rasterized on our side.
+
+# 203 dpi (8 dots/mm) is the common Zebra print head
+dots_per_inch = 203
+
+label_width = int(2.5 * dots_per_inch)
+label_height = int(1 * dots_per_inch)
+
+name_font_height = 26
+name_line_height = 28
+name_max_lines = 2
+exp_font_height = 18
+price_font_height = 56
+
+bar_module_width = 2
+bar_height = 60
+
+
+def zpl_field(text: str) -> str:
+    """
+    Field data with ^FH hex escapes for the characters ZPL treats as commands
+    """
+    return "^FH_^FD" + str(text).replace("_", "_5F").replace("^", "_5E").replace("~", "_7E") + "^FS"
+
+
+def label_zpl(product, exp_enable: bool = True) -> str:
+    lines = ["^XA", "^CI28", f"^PW{label_width}", f"^LL{label_height}"]
+
+    # ZPL font 0 is close enough to Helvetica Bold to wrap with its metrics
+    name_lines = wrap_text(str(product.name), "Helvetica-Bold", name_font_height, label_width - 20)
+    for line_index, line in enumerate(name_lines[:name_max_lines]):
+        lines.append(f"^FO10,{10 + line_index * name_line_height}^A0N,{name_font_height},{name_font_height}"
+                     + zpl_field(line))
+
+    if exp_enable:
+        expiration_date = str(product.expiration_date if product.expiration_date else 'N/A')
+        lines.append(f"^FO10,{12 + name_max_lines * name_line_height}^A0N,{exp_font_height},{exp_font_height}"
+                     + zpl_field(f"EXP: {expiration_date}"))
+
+    lines.append(f"^FO10,{label_height - bar_height - 12}^BY{bar_module_width}^BCN,{bar_height},N,N,N"
+                 + zpl_field(product.upc))
+
+    lines.append(f"^FO{label_width - 190},{label_height - price_font_height - 20}"
+                 f"^A0N,{price_font_height},{price_font_height}" + zpl_field(f"${product.price:.2f}"))
+
+    lines.append("^XZ")
+    return "\n".join(lines) + "\n"
+
+
+def write_zpl(products: Iterable, out: TextIO, exp_enable: bool = True) -> int:
+    """
+    Writes one ZPL label per product to out as it goes, returns the number of labels
+    """
+    total_labels = 0
+    for product in products:
+        out.write(label_zpl(product, exp_enable))
+        total_labels += 1
+    return total_labels
+
+
+@contextmanager
+def open_zpl_output(target: str) -> Iterator[TextIO]:
+    """
+    Opens a file path, or a raw printer port given as tcp://host:port (9100 if no port)
+    """
+    if not target.startswith("tcp://"):
+        with open(target, "w", encoding="utf-8", newline="") as f:
+            yield f
+        return
+
+    host, _, port = target[len("tcp://"):].partition(":")
+    with socket.create_connection((host, int(port or 9100))) as sock:
+        with sock.makefile("w", encoding="utf-8", newline="") as f:
+            yield f